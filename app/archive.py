@@ -0,0 +1,137 @@
+import asyncio
+import calendar
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+from sqlalchemy import and_, distinct, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.db_writer import db_writer
+from app.database import ReadSessionLocal
+from app.ingest import METRIC_COLUMNS, MetricRow, insert_rows
+from app.models import MetricArchive
+from app.colcodec import decode_block, encode_block
+from app import deadband, partitions
+
+
+# Day partitions older than archive_after_days are packed into one compressed
+# columnar block per server and hour (app.colcodec), then dropped. History
+# reads decode the blocks and merge them with the live partitions.
+
+_COLUMNS = METRIC_COLUMNS[1:]  # server_id is the block key
+_KINDS: Dict[str, str] = {
+    "timestamp": "ts",
+    "processes": "int",
+    "reachable": "bool",
+    "services_status": "str",
+    "ports_status": "str",
+    "ports_latency": "str",
+    "probe_status": "str",
+}
+KINDS = tuple(_KINDS.get(name, "float") for name in _COLUMNS)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _micros(ts: datetime) -> int:
+    return calendar.timegm(ts.timetuple()) * 1_000_000 + ts.microsecond
+
+
+def _hour(ts: datetime) -> int:
+    return calendar.timegm(ts.timetuple()) // 3600 * 3600
+
+
+def pack_rows(rows: Sequence[tuple]) -> bytes:
+    """Rows in METRIC_COLUMNS[1:] order -> compressed block"""
+    return encode_block(KINDS, [(_micros(r[0]),) + tuple(r[1:]) for r in rows])
+
+
+def unpack_rows(server_id: int, payload: bytes) -> Iterator[MetricRow]:
+    for row in decode_block(KINDS, payload):
+        yield MetricRow(server_id, _EPOCH + timedelta(microseconds=row[0]), *row[1:])
+
+
+_ARCHIVE_UPSERT = (
+    " ON CONFLICT (server_id, hour) DO UPDATE SET "
+    "samples = excluded.samples, payload = excluded.payload"
+)
+
+
+async def archive_servers(db: AsyncSession, day: date, server_ids: List[int]) -> int:
+    """Pack one day's rows of the given servers into hourly blocks. Does not commit."""
+    table = partitions.partition_table(day)
+    rows = (await db.execute(
+        select(*(table.c[name] for name in METRIC_COLUMNS + (deadband.HELD_COLUMN,)))
+        .where(table.c.server_id.in_(server_ids))
+        .order_by(table.c.server_id, table.c.timestamp)
+    )).all()
+
+    # Blocks hold full values; deadband-held values are filled in first
+    blocks: Dict[tuple, List[tuple]] = {}
+    for row in deadband.expand(rows):
+        blocks.setdefault((row[0], _hour(row[1])), []).append(tuple(row[1:]))
+    await insert_rows(
+        db, MetricArchive.__table__, ("server_id", "hour", "samples", "payload"),
+        ((server_id, hour, len(block), pack_rows(block)) for (server_id, hour), block in blocks.items()),
+        suffix=_ARCHIVE_UPSERT,
+    )
+    return len(rows)
+
+
+async def archive_day(day: date) -> int:
+    """Archive a whole day partition in batches of servers, then drop it"""
+    table = partitions.partition_table(day)
+    async with ReadSessionLocal() as db:
+        server_ids = (await db.execute(select(distinct(table.c.server_id)))).scalars().all()
+
+    total = 0
+    step = max(settings.archive_batch_servers, 1)
+    for i in range(0, len(server_ids), step):
+        batch = list(server_ids[i:i + step])
+        total += await db_writer.run(lambda db, batch=batch: archive_servers(db, day, batch))
+    await db_writer.run(lambda db: partitions.drop_partition(db, day))
+    return total
+
+
+async def archive_pending() -> int:
+    """Archive every partition older than archive_after_days"""
+    cutoff = (datetime.utcnow() - timedelta(days=settings.archive_after_days)).date()
+    async with ReadSessionLocal() as db:
+        days = [d for d in await partitions.list_partitions(db) if d < cutoff]
+    total = 0
+    for day in days:
+        total += await archive_day(day)
+    return total
+
+
+async def archive_loop():
+    """Pack cold partitions every archive_interval_seconds"""
+    while True:
+        try:
+            await archive_pending()
+        except Exception:
+            pass
+        await asyncio.sleep(settings.archive_interval_seconds)
+
+
+async def read_archive(db: AsyncSession, server_id: int, since: datetime, until: Optional[datetime] = None) -> Iterator[MetricRow]:
+    """Archived rows of one server in [since, until], oldest first; blocks are decoded lazily.
+
+    Hours whose day partition still exists are skipped, so a day that is being
+    archived is never read twice.
+    """
+    c = MetricArchive.__table__.c
+    condition = and_(c.server_id == server_id, c.hour >= _hour(since))
+    if until is not None:
+        condition = and_(condition, c.hour <= _hour(until))
+    blocks = (await db.execute(select(c.hour, c.payload).where(condition).order_by(c.hour))).all()
+    live = set(await partitions.list_partitions(db))
+    return _iter_blocks(server_id, blocks, live, since, until)
+
+
+def _iter_blocks(server_id: int, blocks: Iterable[tuple], live: set, since: datetime, until: Optional[datetime]) -> Iterator[MetricRow]:
+    for hour, payload in blocks:
+        if datetime.utcfromtimestamp(hour).date() in live:
+            continue
+        for row in unpack_rows(server_id, payload):
+            if row.timestamp >= since and (until is None or row.timestamp <= until):
+                yield row
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Dict, Iterable, Optional, Set
+from app.config import settings
+from app.fleet_state import fleet_state, server_dict
+
+
+# Live updates for the UI (GET /api/stream). The monitor marks servers with
+# new results; once per push_interval_seconds the broadcaster renders each of
+# them once and offers the entries to every subscriber. A subscriber keeps
+# only the newest entry per server until its stream is written, so a slow
+# client receives merged snapshots instead of growing a backlog.
+
+class Subscriber:
+    def __init__(self, server_ids: Optional[Set[int]]):
+        self.server_ids = server_ids  # None: the whole fleet
+        self.pending: Dict[int, Dict] = {}
+        self.merged = 0  # updates replaced before they were sent
+        self._wake = asyncio.Event()
+
+    def offer(self, entries: Dict[int, Dict]):
+        for server_id, entry in entries.items():
+            if self.server_ids is not None and server_id not in self.server_ids:
+                continue
+            if server_id in self.pending:
+                self.merged += 1
+            self.pending[server_id] = entry
+        if self.pending:
+            self._wake.set()
+
+    async def next(self, timeout: float) -> Optional[list]:
+        """Pending entries, or None after `timeout` seconds without any"""
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._wake.clear()
+        entries, self.pending = list(self.pending.values()), {}
+        return entries
+
+
+class Broadcaster:
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self._dirty: Set[int] = set()
+
+    def notify(self, server_ids: Iterable[int]):
+        """Called by the monitor after results were applied to the fleet state"""
+        if self.subscribers:
+            self._dirty.update(server_ids)
+
+    def subscribe(self, server_ids: Optional[Set[int]] = None) -> Optional[Subscriber]:
+        """New subscriber, or None when push_max_clients are connected"""
+        if len(self.subscribers) >= settings.push_max_clients:
+            return None
+        subscriber = Subscriber(server_ids)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def flush(self):
+        dirty, self._dirty = self._dirty, set()
+        if not dirty or not self.subscribers:
+            return
+        entries = {}
+        for server_id in sorted(dirty):
+            record = fleet_state.record(server_id)
+            if record is not None:
+                entries[server_id] = server_dict(record)
+        for subscriber in list(self.subscribers):
+            subscriber.offer(entries)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.push_interval_seconds)
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "fleet_wide": sum(1 for s in self.subscribers if s.server_ids is None),
+            "merged_updates": sum(s.merged for s in self.subscribers),
+        }
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,116 @@
+import json
+from functools import lru_cache
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Check, Server, check_results
+
+
+# Service and port results are also stored normalized (check_results), next to
+# the JSON columns of the metric rows, so they can be queried per check.
+
+CHECK_RESULT_COLUMNS: Tuple[str, ...] = ("check_id", "timestamp", "server_id", "ok", "latency_ms")
+
+_ids: Dict[Tuple[str, str], int] = {}  # (kind, name) -> checks.id, committed rows only
+
+
+# The same status strings come back probe after probe; callers must not modify the result
+@lru_cache(maxsize=4096)
+def _loads(value: Optional[str]) -> Dict:
+    if not value:
+        return {}
+    try:
+        data = json.loads(value)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def parse_checks(services_status: Optional[str], ports_status: Optional[str], ports_latency: Optional[str]) -> Tuple[Tuple[str, str, bool, Optional[float]], ...]:
+    """Metric row JSON columns -> (kind, name, ok, latency_ms)"""
+    items = [("service", str(name), bool(ok), None) for name, ok in _loads(services_status).items()]
+    latency = _loads(ports_latency)
+    items += [("port", str(port), bool(ok), latency.get(port)) for port, ok in _loads(ports_status).items()]
+    return tuple(items)
+
+
+async def check_ids(db: AsyncSession, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+    """Ids for (kind, name) keys, adding unknown checks to the dictionary. Does not commit."""
+    keys = set(keys)
+    ids = {k: _ids[k] for k in keys if k in _ids}
+    missing = keys - ids.keys()
+    if not missing:
+        return ids
+    known = {(kind, name): id_ for id_, kind, name in (await db.execute(select(Check.id, Check.kind, Check.name))).all()}
+    # Only ids that existed before this transaction are cached; new ones may still be rolled back
+    _ids.update(known)
+    new = [k for k in missing if k not in known]
+    if new:
+        await db.execute(
+            insert(Check).prefix_with("OR IGNORE"),
+            [{"kind": kind, "name": name} for kind, name in new],
+        )
+        known = {(kind, name): id_ for id_, kind, name in (await db.execute(select(Check.id, Check.kind, Check.name))).all()}
+    ids.update({k: known[k] for k in missing if k in known})
+    return ids
+
+
+async def check_result_rows(db: AsyncSession, rows: Iterable[tuple], positions: Dict[str, int]) -> List[tuple]:
+    """check_results rows (CHECK_RESULT_COLUMNS) from the service/port JSON of metric rows.
+
+    positions maps column name -> index in the metric row. Unknown checks are
+    added to the dictionary. Does not commit.
+    """
+    parsed = []
+    for row in rows:
+        items = parse_checks(row[positions["services_status"]], row[positions["ports_status"]], row[positions["ports_latency"]])
+        if items:
+            parsed.append((row[positions["server_id"]], row[positions["timestamp"]], items))
+    if not parsed:
+        return []
+    ids = await check_ids(db, {(kind, name) for _sid, _ts, items in parsed for kind, name, _ok, _lat in items})
+    return [
+        (ids[(kind, name)], ts, server_id, ok, latency)
+        for server_id, ts, items in parsed
+        for kind, name, ok, latency in items
+    ]
+
+
+async def list_checks(db: AsyncSession) -> List[Dict]:
+    rows = (await db.execute(select(Check).order_by(Check.kind, Check.name))).scalars().all()
+    return [{"id": c.id, "kind": c.kind, "name": c.name} for c in rows]
+
+
+async def get_check_failures(db: AsyncSession, since: datetime, kind: Optional[str] = None, name: Optional[str] = None) -> List[Dict]:
+    """Failed results since `since`, grouped per check and server (uses the partial index on failures)"""
+    r = check_results.c
+    query = (
+        select(
+            Check.kind, Check.name, r.server_id, Server.hostname,
+            func.count().label("failures"), func.min(r.timestamp).label("first_failure"), func.max(r.timestamp).label("last_failure"),
+        )
+        .select_from(check_results)
+        .join(Check, Check.id == r.check_id)
+        .outerjoin(Server, Server.id == r.server_id)
+        # `ok = 0` (not `IS 0`) so SQLite can use the partial index on failures
+        .where(and_(r.ok == False, r.timestamp >= since))
+        .group_by(Check.kind, Check.name, r.server_id, Server.hostname)
+        .order_by(Check.kind, Check.name, func.count().desc())
+    )
+    if kind:
+        query = query.where(Check.kind == kind)
+    if name:
+        query = query.where(Check.name == name)
+    return [
+        {
+            "kind": row.kind,
+            "name": row.name,
+            "server_id": row.server_id,
+            "hostname": row.hostname,
+            "failures": row.failures,
+            "first_failure": row.first_failure.isoformat() if row.first_failure else None,
+            "last_failure": row.last_failure.isoformat() if row.last_failure else None,
+        }
+        for row in (await db.execute(query)).all()
+    ]
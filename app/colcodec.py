@@ -0,0 +1,298 @@
+import struct
+import zlib
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+
+# Columnar block encodings for the cold metric archive:
+#   ts    - microsecond timestamps, delta-of-delta + zigzag varints
+#   float - Gorilla style XOR against the previous value, bit packed
+#   int   - delta + zigzag varints
+#   bool  - run-length encoded (None / False / True)
+#   str   - run-length encoded indexes into a per-block dictionary
+# float and int columns carry a run-length encoded presence mask, so NULLs cost
+# nothing in the value stream. The concatenated columns are zlib compressed.
+
+FORMAT_VERSION = 1
+
+
+# ---- varints ----
+
+def _zigzag(n: int) -> int:
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+
+def _unzigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+def _put_varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    shift = result = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+# ---- bit streams ----
+
+class _BitWriter:
+    def __init__(self):
+        self.value = 0
+        self.bits = 0
+
+    def write(self, value: int, width: int):
+        self.value = (self.value << width) | (value & ((1 << width) - 1))
+        self.bits += width
+
+    def getvalue(self) -> bytes:
+        pad = -self.bits % 8
+        return (self.value << pad).to_bytes((self.bits + pad) // 8, "big")
+
+
+class _BitReader:
+    def __init__(self, data: bytes):
+        self.value = int.from_bytes(data, "big")
+        self.remaining = len(data) * 8
+
+    def read(self, width: int) -> int:
+        self.remaining -= width
+        return (self.value >> self.remaining) & ((1 << width) - 1)
+
+
+# ---- run-length encoding ----
+
+def _encode_runs(values: Sequence[int]) -> bytes:
+    """Small non-negative ints as (value, run length) varint pairs"""
+    out = bytearray()
+    i = 0
+    while i < len(values):
+        j = i
+        while j < len(values) and values[j] == values[i]:
+            j += 1
+        _put_varint(out, values[i])
+        _put_varint(out, j - i)
+        i = j
+    return bytes(out)
+
+
+def _decode_runs(data: bytes, count: int) -> List[int]:
+    values: List[int] = []
+    pos = 0
+    while len(values) < count:
+        value, pos = _get_varint(data, pos)
+        run, pos = _get_varint(data, pos)
+        values.extend([value] * run)
+    return values
+
+
+# ---- column codecs ----
+
+def encode_timestamps(values: Sequence[int]) -> bytes:
+    out = bytearray()
+    prev = prev_delta = 0
+    for i, v in enumerate(values):
+        if i == 0:
+            _put_varint(out, _zigzag(v))
+        else:
+            delta = v - prev
+            _put_varint(out, _zigzag(delta - prev_delta))
+            prev_delta = delta
+        prev = v
+    return bytes(out)
+
+
+def decode_timestamps(data: bytes, count: int) -> List[int]:
+    values: List[int] = []
+    pos = 0
+    prev = prev_delta = 0
+    for i in range(count):
+        n, pos = _get_varint(data, pos)
+        n = _unzigzag(n)
+        if i == 0:
+            prev = n
+        else:
+            prev_delta += n
+            prev += prev_delta
+        values.append(prev)
+    return values
+
+
+def _float_bits(v: float) -> int:
+    return struct.unpack(">Q", struct.pack(">d", v))[0]
+
+
+def _bits_float(b: int) -> float:
+    return struct.unpack(">d", struct.pack(">Q", b))[0]
+
+
+def encode_floats(values: Sequence[Optional[float]]) -> bytes:
+    present = [0 if v is None else 1 for v in values]
+    writer = _BitWriter()
+    prev = None
+    lead = trail = -1
+    for v in values:
+        if v is None:
+            continue
+        bits = _float_bits(float(v))
+        if prev is None:
+            writer.write(bits, 64)
+        else:
+            xor = bits ^ prev
+            if xor == 0:
+                writer.write(0, 1)
+            else:
+                new_lead = min(64 - xor.bit_length(), 31)
+                new_trail = (xor & -xor).bit_length() - 1
+                if lead >= 0 and new_lead >= lead and new_trail >= trail:
+                    # Meaningful bits fit in the previous window
+                    writer.write(0b10, 2)
+                    writer.write(xor >> trail, 64 - lead - trail)
+                else:
+                    lead, trail = new_lead, new_trail
+                    length = 64 - lead - trail
+                    writer.write(0b11, 2)
+                    writer.write(lead, 5)
+                    writer.write(length - 1, 6)
+                    writer.write(xor >> trail, length)
+        prev = bits
+    mask = _encode_runs(present)
+    out = bytearray()
+    _put_varint(out, len(mask))
+    return bytes(out) + mask + writer.getvalue()
+
+
+def decode_floats(data: bytes, count: int) -> List[Optional[float]]:
+    mask_len, pos = _get_varint(data, 0)
+    present = _decode_runs(data[pos:pos + mask_len], count)
+    reader = _BitReader(data[pos + mask_len:])
+    values: List[Optional[float]] = []
+    prev = None
+    lead = trail = 0
+    for flag in present:
+        if not flag:
+            values.append(None)
+            continue
+        if prev is None:
+            bits = reader.read(64)
+        elif reader.read(1) == 0:
+            bits = prev
+        else:
+            if reader.read(1) == 1:
+                lead = reader.read(5)
+                trail = 64 - lead - (reader.read(6) + 1)
+            bits = prev ^ (reader.read(64 - lead - trail) << trail)
+        values.append(_bits_float(bits))
+        prev = bits
+    return values
+
+
+def encode_ints(values: Sequence[Optional[int]]) -> bytes:
+    present = [0 if v is None else 1 for v in values]
+    out = bytearray()
+    prev = 0
+    for v in values:
+        if v is not None:
+            _put_varint(out, _zigzag(int(v) - prev))
+            prev = int(v)
+    mask = _encode_runs(present)
+    head = bytearray()
+    _put_varint(head, len(mask))
+    return bytes(head) + mask + bytes(out)
+
+
+def decode_ints(data: bytes, count: int) -> List[Optional[int]]:
+    mask_len, pos = _get_varint(data, 0)
+    present = _decode_runs(data[pos:pos + mask_len], count)
+    pos += mask_len
+    values: List[Optional[int]] = []
+    prev = 0
+    for flag in present:
+        if not flag:
+            values.append(None)
+            continue
+        n, pos = _get_varint(data, pos)
+        prev += _unzigzag(n)
+        values.append(prev)
+    return values
+
+
+def encode_bools(values: Sequence[Optional[bool]]) -> bytes:
+    return _encode_runs([0 if v is None else 2 if v else 1 for v in values])
+
+
+def decode_bools(data: bytes, count: int) -> List[Optional[bool]]:
+    return [None if v == 0 else v == 2 for v in _decode_runs(data, count)]
+
+
+def encode_strings(values: Sequence[Optional[str]]) -> bytes:
+    dictionary: List[Optional[str]] = [None]
+    index = {None: 0}
+    codes = []
+    for v in values:
+        if v not in index:
+            index[v] = len(dictionary)
+            dictionary.append(v)
+        codes.append(index[v])
+    out = bytearray()
+    _put_varint(out, len(dictionary) - 1)
+    for s in dictionary[1:]:
+        raw = s.encode("utf-8")
+        _put_varint(out, len(raw))
+        out += raw
+    return bytes(out) + _encode_runs(codes)
+
+
+def decode_strings(data: bytes, count: int) -> List[Optional[str]]:
+    size, pos = _get_varint(data, 0)
+    dictionary: List[Optional[str]] = [None]
+    for _ in range(size):
+        length, pos = _get_varint(data, pos)
+        dictionary.append(data[pos:pos + length].decode("utf-8"))
+        pos += length
+    return [dictionary[code] for code in _decode_runs(data[pos:], count)]
+
+
+_CODECS = {
+    "ts": (encode_timestamps, decode_timestamps),
+    "float": (encode_floats, decode_floats),
+    "int": (encode_ints, decode_ints),
+    "bool": (encode_bools, decode_bools),
+    "str": (encode_strings, decode_strings),
+}
+
+
+# ---- blocks ----
+
+def encode_block(kinds: Sequence[str], rows: Sequence[tuple]) -> bytes:
+    """rows of len(kinds) values -> compressed columnar block"""
+    out = bytearray([FORMAT_VERSION])
+    _put_varint(out, len(rows))
+    for i, kind in enumerate(kinds):
+        encoded = _CODECS[kind][0]([row[i] for row in rows])
+        _put_varint(out, len(encoded))
+        out += encoded
+    return zlib.compress(bytes(out), 6)
+
+
+def decode_block(kinds: Sequence[str], payload: bytes) -> Iterator[tuple]:
+    """Inverse of encode_block, yields row tuples"""
+    data = zlib.decompress(payload)
+    if data[0] != FORMAT_VERSION:
+        raise ValueError(f"unsupported archive block version {data[0]}")
+    count, pos = _get_varint(data, 1)
+    columns = []
+    for kind in kinds:
+        length, pos = _get_varint(data, pos)
+        columns.append(_CODECS[kind][1](data[pos:pos + length], count))
+        pos += length
+    return zip(*columns)
@@ -8,6 +8,14 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite+aiosqlite:///./server_check.db"
+    db_read_pool_size: int = 5  # connections reserved for page/API reads
+    db_write_batch_seconds: float = 1.0  # queued writes within this window share one transaction
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"  # durable across app crashes; WAL makes FULL unnecessary
+    sqlite_cache_size_kb: int = 65536  # page cache per connection
+    sqlite_mmap_size: int = 268435456  # bytes of the database file mapped into memory
+    sqlite_busy_timeout_ms: int = 5000  # wait this long for the write lock instead of failing
+    sqlite_auto_vacuum: str = "INCREMENTAL"  # applies to new databases; existing ones need one VACUUM to switch
     
     # Security
     secret_key: str = secrets.token_urlsafe(32)
@@ -34,10 +42,33 @@ class Settings(BaseSettings):
     # Monitoring
     monitoring_interval: int = 60  # seconds
     monitor_interval_seconds: int = 60  # seconds (alias for compatibility)
+    monitor_jitter_fraction: float = 0.1  # random +/- share of a server's interval per slot
+    monitor_refresh_seconds: int = 30  # how often the scheduler reloads the server list
     metrics_retention_days: int = 30
     retention_days: int = 30  # alias for compatibility
+    rollup_1m_retention_days: int = 7  # 1-minute min/max/avg/last tier
+    rollup_5m_retention_days: int = 31  # 5-minute tier
+    rollup_1h_retention_days: int = 400  # 1-hour tier
+    state_intervals_retention_days: int = 400  # up/down and check state intervals (uptime reports)
+    alert_events_retention_days: int = 90
+    audit_logs_retention_days: int = 365
+    retention_run_at: str = "03:30"  # daily start of the retention engine, UTC HH:MM
+    retention_chunk_rows: int = 5000  # rows per delete transaction
+    retention_pause_seconds: float = 0.5  # pause between retention chunks
+    retention_vacuum_pages: int = 1000  # pages per incremental_vacuum step
+    rollup_fold_seconds: int = 60  # how often the 5-minute and 1-hour tiers are refreshed
+    archive_after_days: int = 2  # day partitions older than this are packed into the compressed archive
+    archive_interval_seconds: int = 3600  # how often the archiver looks for partitions to pack
+    archive_batch_servers: int = 100  # servers packed per write transaction
+    deadband_thresholds: str = ""  # change-only storage per metric, e.g. "disk_percent=0.5,processes=2"; empty stores every value
+    deadband_heartbeat_seconds: int = 300  # a held metric is stored again at least this often
     alert_evaluation_interval: int = 300  # seconds
+    ingest_chunk_size: int = 500  # rows per executemany in the bulk insert path
     max_concurrency: int = 10  # maximum concurrent monitoring tasks
+    local_sample_resolution_seconds: float = 1.0  # psutil sampling period for localhost metrics
+    push_interval_seconds: float = 1.0  # live updates (/api/stream) are batched over this period
+    push_heartbeat_seconds: int = 15  # keep-alive comment on idle streams
+    push_max_clients: int = 500  # concurrent /api/stream subscribers
     
     # Rate limiting
     login_rate_limit_window: int = 900  # 15 minutes
@@ -66,10 +97,19 @@ class Settings(BaseSettings):
     discord_webhook_url: Optional[str] = None
     
     # Remote monitoring
-    ssh_timeout: int = 10
-    snmp_timeout: int = 5
+    ssh_timeout: int = 10  # connect/login and collector command deadline
+    ssh_pool_max_connections: int = 1000  # live SSH connections kept between cycles (soft: busy ones are never evicted)
+    ssh_pool_idle_seconds: int = 600  # close pooled connections unused for this long
+    ssh_keepalive_interval: int = 30
+    ssh_keepalive_count_max: int = 3
+    snmp_timeout: int = 5  # deadline for one server's SNMP requests
     snmp_retries: int = 3
     ping_timeout_seconds: int = 3
+    ping_count: int = 1  # echo requests per host per cycle
+    service_check_timeout: float = 5.0  # local `systemctl show` for all monitored services
+    port_check_timeout: float = 2.0  # TCP connect timeout per port
+    port_check_max_in_flight: int = 200  # TCP connects in flight across the whole fleet
+    probe_deadline_seconds: float = 20.0  # hard limit for one server probe, all sources included
     
     class Config:
         env_file = ".env"
@@ -1,10 +1,45 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.config import settings
 
 
+_is_sqlite = settings.database_url.startswith("sqlite")
+
+
+def _apply_sqlite_profile(dbapi_connection, connection_record, read_only: bool = False):
+    """Storage profile for every new SQLite connection: WAL lets readers run alongside the writer"""
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        # Only takes effect on a new, empty database (before journal_mode writes the header);
+        # lets retention return freed pages with incremental_vacuum
+        cursor.execute(f"PRAGMA auto_vacuum={settings.sqlite_auto_vacuum}")
+    cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kb)}")  # negative = KiB
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+# Writes: the background db_writer task plus interactive UI changes
 engine = create_async_engine(settings.database_url, echo=False, future=True)
+
+# Reads: separate pool, so page and API reads never queue behind a write transaction
+if _is_sqlite:
+    read_engine = create_async_engine(
+        settings.database_url, echo=False, future=True,
+        pool_size=settings.db_read_pool_size, max_overflow=settings.db_read_pool_size,
+    )
+    event.listen(engine.sync_engine, "connect", _apply_sqlite_profile)
+    event.listen(read_engine.sync_engine, "connect", lambda conn, rec: _apply_sqlite_profile(conn, rec, read_only=True))
+else:
+    read_engine = engine
+
 AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -13,4 +48,6 @@ async def get_db():
         yield session
 
 
-
+async def get_read_db():
+    async with ReadSessionLocal() as session:
+        yield session
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import AsyncSessionLocal
+
+
+Job = Callable[[AsyncSession], Awaitable[Any]]
+Inserter = Callable[[AsyncSession, List[tuple]], Awaitable[Any]]  # e.g. app.ingest.insert_metrics
+
+
+class DbWriter:
+    """Single writer task for background database writes.
+
+    Queued rows are merged per insert function into one bulk insert, and
+    everything queued within one batch window (rows and jobs alike) is
+    committed as a single transaction. If that transaction fails, the rows
+    and each job are retried in transactions of their own, so one bad job
+    only fails its own caller. Callbacks registered with on_commit see the
+    rows once they are committed.
+    """
+
+    def __init__(self, session_factory, batch_seconds: float):
+        self.session_factory = session_factory
+        self.batch_seconds = batch_seconds
+        self._rows: Dict[Inserter, List[tuple]] = {}  # insert function -> pending rows
+        self._jobs: List[Tuple[Job, asyncio.Future]] = []
+        self._on_commit: Dict[Inserter, List[Callable[[List[tuple]], None]]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"batches": 0, "rows": 0, "jobs": 0, "failed_batches": 0, "last_batch_ms": None}
+
+    def _event(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the task and flush whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self._rows or self._jobs:
+            await self._flush()
+
+    def add_rows(self, insert: Inserter, rows) -> None:
+        """Queue rows for insert(db, rows) (fire and forget)"""
+        self._rows.setdefault(insert, []).extend(rows)
+        self._event().set()
+
+    def on_commit(self, insert: Inserter, callback: Callable[[List[tuple]], None]) -> None:
+        """Call callback(rows) after rows queued for insert() were committed"""
+        self._on_commit.setdefault(insert, []).append(callback)
+
+    async def run(self, job: Job) -> Any:
+        """Run job(db) inside the next write transaction and return its result"""
+        future = asyncio.get_running_loop().create_future()
+        self._jobs.append((job, future))
+        self._event().set()
+        if self._task is None:
+            # Writer not started (scripts, one-off jobs): flush right away
+            await self._flush()
+        return await future
+
+    async def _run(self):
+        wakeup = self._event()
+        while True:
+            await wakeup.wait()
+            # Let the rest of the batch window's writes pile up behind the first one
+            await asyncio.sleep(self.batch_seconds)
+            wakeup.clear()
+            try:
+                await self._flush()
+            except Exception:
+                pass
+
+    async def _flush(self):
+        rows, self._rows = self._rows, {}
+        jobs, self._jobs = self._jobs, []
+        if not rows and not jobs:
+            return
+        started = time.perf_counter()
+        try:
+            results = await self._write(rows, jobs)
+        except Exception:
+            self.stats["failed_batches"] += 1
+            await self._write_separately(rows, jobs)
+        else:
+            for (_job, future), result in zip(jobs, results):
+                if not future.done():
+                    future.set_result(result)
+        self.stats["batches"] += 1
+        self.stats["rows"] += sum(len(r) for r in rows.values())
+        self.stats["jobs"] += len(jobs)
+        self.stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+
+    async def _write(self, rows: Dict[Inserter, List[tuple]], jobs: List[Tuple[Job, asyncio.Future]]) -> List[Any]:
+        async with self.session_factory() as db:
+            for insert, pending in rows.items():
+                await insert(db, pending)
+            results = [await job(db) for job, _future in jobs]
+            await db.commit()
+        self._committed(rows)
+        return results
+
+    def _committed(self, rows: Dict[Inserter, List[tuple]]):
+        for insert, pending in rows.items():
+            for callback in self._on_commit.get(insert, ()):
+                try:
+                    callback(pending)
+                except Exception:
+                    pass
+
+    async def _write_separately(self, rows: Dict[Inserter, List[tuple]], jobs: List[Tuple[Job, asyncio.Future]]):
+        if rows:
+            try:
+                await self._write(rows, [])
+            except Exception:
+                pass
+        for job, future in jobs:
+            try:
+                result = (await self._write({}, [(job, future)]))[0]
+            except Exception as exc:
+                if not future.done():
+                    future.set_exception(exc)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+
+db_writer = DbWriter(AsyncSessionLocal, settings.db_write_batch_seconds)
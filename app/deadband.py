@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import settings
+
+
+# Optional change-only storage for raw metrics (DEADBAND_THRESHOLDS). A value
+# within its threshold of the last stored value is written as NULL and its bit
+# is set in the row's `held` mask (bit = position in METRIC_COLUMNS); readers
+# carry the last stored value forward (expand). A value is always stored again
+# after DEADBAND_HEARTBEAT_SECONDS and on the first sample of a UTC day, so
+# every day partition can be expanded on its own.
+
+HELD_COLUMN = "held"
+
+_last: Dict[Tuple[int, int], Tuple[object, datetime]] = {}  # (server_id, position) -> committed (value, stored at)
+_PENDING = "deadband"  # session.info key: values stored by the current transaction
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        _last.update(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+@lru_cache(maxsize=8)
+def _parse(spec: str, columns: Tuple[str, ...]) -> Dict[int, float]:
+    """"disk_percent=0.5,processes=2" -> {position: threshold}; unknown names are ignored"""
+    rules = {}
+    for part in spec.split(","):
+        name, _, threshold = part.partition("=")
+        name = name.strip()
+        if name in columns[2:]:  # never server_id / timestamp
+            try:
+                rules[columns.index(name)] = float(threshold or 0)
+            except ValueError:
+                pass
+    return rules
+
+
+def rules(columns: Tuple[str, ...]) -> Dict[int, float]:
+    return _parse(settings.deadband_thresholds or "", columns)
+
+
+def _unchanged(value, last, threshold: float) -> bool:
+    if value is None or last is None:
+        return value is last
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return abs(value - last) <= threshold
+    return value == last
+
+
+def apply(db: AsyncSession, rows: Iterable[tuple], columns: Tuple[str, ...]) -> List[tuple]:
+    """Metric rows -> rows with held values set to NULL and the held mask appended.
+
+    Rows are (server_id, timestamp, ...) in `columns` order.
+    """
+    active = rules(columns)
+    pending: Dict[Tuple[int, int], Tuple[object, datetime]] = db.info.setdefault(_PENDING, {})
+    heartbeat = timedelta(seconds=settings.deadband_heartbeat_seconds)
+    out = []
+    for row in sorted(rows, key=lambda r: r[1]):
+        server_id, ts = row[0], row[1]
+        values = list(row)
+        held = 0
+        for pos, threshold in active.items():
+            key = (server_id, pos)
+            last = pending.get(key) or _last.get(key)
+            if last is not None and ts <= last[1]:
+                continue  # late sample: stored as is, does not move the reference
+            if (last is not None and ts - last[1] < heartbeat and ts.date() == last[1].date()
+                    and _unchanged(row[pos], last[0], threshold)):
+                values[pos] = None
+                held |= 1 << pos
+            else:
+                pending[key] = (row[pos], ts)
+        values.append(held or None)
+        out.append(tuple(values))
+    return out
+
+
+def expand(rows: Iterable[Sequence], server_pos: int = 0) -> Iterator[tuple]:
+    """Inverse of apply for rows read back with the held mask last.
+
+    Rows must be ordered by time within each server; yields the rows without
+    the mask, with held values filled from the server's previous row.
+    """
+    previous: Dict[int, tuple] = {}
+    for row in rows:
+        held = row[-1]
+        values = tuple(row[:-1])
+        if held:
+            before = previous.get(values[server_pos])
+            filled = list(values)
+            pos = 0
+            while held:
+                if held & 1:
+                    filled[pos] = before[pos] if before is not None else None
+                held >>= 1
+                pos += 1
+            values = tuple(filled)
+        previous[values[server_pos]] = values
+        yield values
@@ -0,0 +1,106 @@
+import calendar
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+
+# Server-side downsampling and the columnar layout for /api/metrics.
+# Each selected field gets an equal share of max_points; the union of the
+# chosen samples is returned, so all fields keep one shared timestamp array.
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the shape of the series"""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def minmax(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Min and max sample of each of threshold/2 equal-count buckets (keeps spikes)"""
+    n = len(xs)
+    if threshold >= n or threshold < 4:
+        return list(range(n))
+    buckets = threshold // 2
+    selected = set()
+    for b in range(buckets):
+        start, end = b * n // buckets, (b + 1) * n // buckets
+        if start >= end:
+            continue
+        segment = range(start, end)
+        selected.add(min(segment, key=ys.__getitem__))
+        selected.add(max(segment, key=ys.__getitem__))
+    return sorted(selected)
+
+
+_METHODS = {"lttb": lttb, "minmax": minmax}
+
+
+def _epoch(timestamp: str) -> float:
+    ts = datetime.fromisoformat(timestamp)
+    return calendar.timegm(ts.timetuple()) + ts.microsecond / 1e6
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def downsample_points(points: List[Dict], fields: Optional[List[str]], max_points: int, method: str = "lttb") -> List[Dict]:
+    """At most max_points history points (API dicts), chosen per numeric field with `method`"""
+    n = len(points)
+    if n <= max_points or method not in _METHODS:
+        return points
+    if fields is None:
+        fields = [name for name, value in points[0].items() if _is_number(value)]
+    xs = [_epoch(p["timestamp"]) for p in points]
+    series = []
+    for name in fields:
+        index = [i for i, p in enumerate(points) if _is_number(p.get(name))]
+        if len(index) >= 2:
+            series.append((name, index))
+
+    chosen = set()
+    budget = max(max_points // max(len(series), 1), 3)
+    for name, index in series:
+        picked = _METHODS[method]([xs[i] for i in index], [float(points[i][name]) for i in index], budget)
+        chosen.update(index[k] for k in picked)
+    if not chosen:
+        step = n / max_points
+        chosen = {int(i * step) for i in range(max_points)}
+    return [points[i] for i in sorted(chosen)]
+
+
+def to_columns(points: List[Dict], fields: Optional[List[str]], resolution: int) -> Dict:
+    """Columnar layout: one array per field plus `timestamp` (unix milliseconds)"""
+    if fields is None:
+        fields = [name for name in (points[0] if points else {}) if name != "timestamp"]
+    columns: Dict = {
+        "resolution": resolution,
+        "count": len(points),
+        "timestamp": [round(_epoch(p["timestamp"]) * 1000) for p in points],
+    }
+    for name in fields:
+        if name != "timestamp":
+            columns[name] = [p.get(name) for p in points]
+    return columns
@@ -0,0 +1,212 @@
+import asyncio
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Server, MetricLatest
+
+
+@dataclass(slots=True)
+class LatestMetric:
+    """Latest probe result of one server; fields follow app.ingest.METRIC_COLUMNS after server_id"""
+    timestamp: datetime
+    cpu_percent: Optional[float]
+    cpu_temp: Optional[float]
+    ram_percent: Optional[float]
+    swap_percent: Optional[float]
+    disk_percent: Optional[float]
+    disk_io_read: Optional[float]
+    disk_io_write: Optional[float]
+    processes: Optional[int]
+    network_in_kbps: Optional[float]
+    network_out_kbps: Optional[float]
+    reachable: Optional[bool]
+    ping_rtt_ms: Optional[float]
+    packet_loss: Optional[float]
+    services_status: Optional[str]
+    ports_status: Optional[str]
+    ports_latency: Optional[str]
+    probe_status: Optional[str]
+    probe_duration_ms: Optional[float]
+
+
+_LATEST_FIELDS = [f.name for f in fields(LatestMetric)]
+
+
+@dataclass(slots=True)
+class ServerRecord:
+    """Server attributes needed by the list views, plus its latest metric"""
+    id: int
+    hostname: str
+    ip_address: str
+    system_name: Optional[str]
+    owner: Optional[str]
+    is_cluster: bool
+    environment: Optional[str]
+    tags: Optional[str]
+    metric_source: Optional[str]
+    latest: Optional[LatestMetric] = None
+
+
+_SERVER_FIELDS = [f.name for f in fields(ServerRecord) if f.name != "latest"]
+
+
+class FleetState:
+    """In-memory current state of the fleet.
+
+    The monitor updates it after every probe and the server handlers after
+    every change, so the server list, /api/servers and /metrics render
+    without touching the database. Every change bumps `version`; rendered
+    views are cached per version and their ETags derive from it. The
+    database is read once, on cold start.
+    """
+
+    def __init__(self):
+        self._records: Dict[int, ServerRecord] = {}
+        self.version = 0
+        self._epoch = int(time.time())  # versions restart with the process; keeps ETags from colliding
+        self._loaded = False
+        self._lock: Optional[asyncio.Lock] = None
+        self._views: Dict[str, Tuple[int, object]] = {}  # name -> (version, rendered)
+        self._stored: Dict[int, int] = {}  # server_id -> committed metric batches (history ETags)
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """Cold start: load servers and metrics_latest once"""
+        if self._loaded:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._loaded:
+                return
+            rows = (await db.execute(
+                select(Server, MetricLatest).outerjoin(MetricLatest, MetricLatest.server_id == Server.id)
+            )).all()
+            for server, metric in rows:
+                record = self._record_from_server(server)
+                if metric is not None:
+                    record.latest = LatestMetric(*(getattr(metric, name) for name in _LATEST_FIELDS))
+                # Keep anything the monitor already reported while we were loading
+                known = self._records.get(server.id)
+                if known is not None and known.latest is not None:
+                    if record.latest is None or known.latest.timestamp >= record.latest.timestamp:
+                        record.latest = known.latest
+                self._records[server.id] = record
+            self._loaded = True
+            self.version += 1
+
+    @staticmethod
+    def _record_from_server(server: Server) -> ServerRecord:
+        return ServerRecord(*(getattr(server, name) for name in _SERVER_FIELDS))
+
+    def records(self) -> List[ServerRecord]:
+        return [self._records[server_id] for server_id in sorted(self._records)]
+
+    def record(self, server_id: int) -> Optional[ServerRecord]:
+        return self._records.get(server_id)
+
+    def upsert_server(self, server: Server):
+        record = self._record_from_server(server)
+        known = self._records.get(server.id)
+        if known is not None:
+            record.latest = known.latest
+        self._records[server.id] = record
+        self.version += 1
+
+    def remove_server(self, server_id: int):
+        if self._records.pop(server_id, None) is not None:
+            self.version += 1
+
+    def sync_servers(self, servers: Iterable[Server]):
+        """Reconcile with a full server list (scheduler refresh); catches changes made behind our back"""
+        if not self._loaded:
+            return
+        seen = set()
+        for server in servers:
+            seen.add(server.id)
+            known = self._records.get(server.id)
+            if known is None or any(getattr(known, name) != getattr(server, name) for name in _SERVER_FIELDS):
+                self.upsert_server(server)
+        for server_id in [i for i in self._records if i not in seen]:
+            self.remove_server(server_id)
+
+    def update_metrics(self, rows: Iterable[tuple]):
+        """Apply metric rows (app.ingest.metric_row tuples)"""
+        for row in rows:
+            record = self._records.get(row[0])
+            if record is None:
+                continue  # unknown until loaded or already deleted
+            latest = LatestMetric(*row[1:])
+            if record.latest is None or latest.timestamp >= record.latest.timestamp:
+                record.latest = latest
+                self.version += 1
+
+    def etag(self, name: str) -> str:
+        """Weak ETag of a view at the current version"""
+        return f'W/"{name}-{self._epoch}-{self.version}"'
+
+    def mark_stored(self, rows: Iterable[tuple]):
+        """Metric rows are committed (app.ingest.metric_row tuples); moves the history ETags on"""
+        for server_id in {row[0] for row in rows}:
+            self._stored[server_id] = self._stored.get(server_id, 0) + 1
+
+    def metrics_etag(self, server_id: int) -> Optional[str]:
+        """Weak ETag for a server's history: changes whenever its rows are committed.
+
+        Latest values reach the fleet state before the writer commits them, so
+        this follows committed batches instead; None until the first one.
+        """
+        stored = self._stored.get(server_id)
+        if stored is None:
+            return None
+        return f'W/"m{server_id}-{self._epoch}-{stored}"'
+
+    def view(self, name: str, render):
+        """render() result, cached until the state changes"""
+        cached = self._views.get(name)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        value = render()
+        self._views[name] = (self.version, value)
+        return value
+
+
+def server_dict(record: ServerRecord) -> Dict:
+    """/api/servers entry (same shape as MonitoringService.get_servers_with_latest_metrics)"""
+    metric = record.latest
+    return {
+        "id": record.id,
+        "hostname": record.hostname,
+        "ip_address": record.ip_address,
+        "system_name": record.system_name,
+        "owner": record.owner,
+        "is_cluster": record.is_cluster,
+        "tags": record.tags,
+        "metric_source": record.metric_source,
+        "latest_metric": {
+            "timestamp": metric.timestamp.isoformat() if metric.timestamp else None,
+            "cpu_percent": metric.cpu_percent,
+            "cpu_temp": metric.cpu_temp,
+            "ram_percent": metric.ram_percent,
+            "swap_percent": metric.swap_percent,
+            "disk_percent": metric.disk_percent,
+            "disk_io_read": metric.disk_io_read,
+            "disk_io_write": metric.disk_io_write,
+            "processes": metric.processes,
+            "network_in_kbps": metric.network_in_kbps,
+            "network_out_kbps": metric.network_out_kbps,
+            "network_io": round(((metric.network_in_kbps or 0) + (metric.network_out_kbps or 0)) / 1024, 2),  # Convert kbps to MB/s
+            "reachable": metric.reachable,
+            "ping_rtt_ms": metric.ping_rtt_ms,
+            "packet_loss": metric.packet_loss,
+            "probe_status": metric.probe_status,
+            "services_status": metric.services_status,
+            "ports_status": metric.ports_status,
+            "ports_latency": metric.ports_latency,
+        } if metric else None,
+    }
+
+
+fleet_state = FleetState()
@@ -0,0 +1,257 @@
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP6_ECHO_REQUEST = 128
+ICMP6_ECHO_REPLY = 129
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PingResult:
+    host: str
+    sent: int = 0
+    received: int = 0
+    rtt_ms: Optional[float] = None  # average RTT of received replies
+
+    @property
+    def reachable(self) -> bool:
+        return self.received > 0
+
+    @property
+    def loss(self) -> float:
+        if not self.sent:
+            return 1.0
+        return 1.0 - self.received / self.sent
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack("!%dH" % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class _IcmpSocket:
+    """One non-blocking ICMP socket per address family, shared by all probes"""
+
+    def __init__(self, family: int):
+        self.family = family
+        self.proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+        # Prefer unprivileged datagram sockets (net.ipv4.ping_group_range), fall back to raw
+        try:
+            self.sock = socket.socket(family, socket.SOCK_DGRAM, self.proto)
+            self.raw = False
+        except OSError:
+            self.sock = socket.socket(family, socket.SOCK_RAW, self.proto)
+            self.raw = True
+        self.sock.setblocking(False)
+        # Datagram sockets get their identifier rewritten by the kernel to the local port
+        self.ident = os.getpid() & 0xFFFF if self.raw else None
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+
+class IcmpProber:
+    """Asyncio ICMP echo prober.
+
+    Echo requests for any number of hosts go out over one socket per address
+    family; replies are matched back to their waiter by (address, sequence).
+    Loops without add_reader (the Windows proactor loop) read replies on a
+    thread per socket instead.
+    """
+
+    def __init__(self):
+        self._sockets: Dict[int, _IcmpSocket] = {}
+        self._pending: Dict[Tuple[str, int], Tuple[asyncio.Future, float]] = {}
+        self._seq = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._threaded = False  # replies are read on threads (no add_reader on this loop)
+        self._denied: set = set()  # families already logged as unavailable
+
+    def _socket(self, family: int) -> _IcmpSocket:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Event loop changed (tests, reload): start over with fresh sockets
+            self.close()
+            self._loop = loop
+            self._threaded = False
+        s = self._sockets.get(family)
+        if s is None:
+            s = _IcmpSocket(family)
+            if not self._threaded:
+                try:
+                    loop.add_reader(s.sock.fileno(), self._on_readable, s)
+                except NotImplementedError:
+                    logger.warning("%s has no add_reader; reading ICMP replies on threads", type(loop).__name__)
+                    self._threaded = True
+            if self._threaded:
+                s.sock.settimeout(0.5)  # lets the reader thread notice close()
+                threading.Thread(target=self._read_blocking, args=(s, loop), name="icmp-reader", daemon=True).start()
+            self._sockets[family] = s
+        return s
+
+    def close(self):
+        for s in self._sockets.values():
+            if self._loop is not None and not self._loop.is_closed() and not self._threaded:
+                try:
+                    self._loop.remove_reader(s.sock.fileno())
+                except Exception:
+                    pass
+            s.close()
+        self._sockets.clear()
+        for fut, _ in self._pending.values():
+            if not fut.done():
+                fut.cancel()
+        self._pending.clear()
+
+    def _next_seq(self) -> int:
+        return next(self._seq) & 0xFFFF
+
+    def _on_readable(self, s: _IcmpSocket):
+        while True:
+            try:
+                data, addr = s.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            self._on_reply(s, data, addr, time.perf_counter())
+
+    def _read_blocking(self, s: _IcmpSocket, loop: asyncio.AbstractEventLoop):
+        """Reader thread: blocking receives, replies handed to the event loop"""
+        while not s.closed:
+            try:
+                data, addr = s.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                if s.closed:
+                    return
+                continue
+            try:
+                loop.call_soon_threadsafe(self._on_reply, s, data, addr, time.perf_counter())
+            except RuntimeError:
+                return  # loop closed
+
+    def _on_reply(self, s: _IcmpSocket, data: bytes, addr: tuple, received_at: float):
+        if s.family == socket.AF_INET:
+            if s.raw:
+                # Raw IPv4 sockets deliver the IP header as well
+                data = data[(data[0] & 0x0F) * 4:]
+            reply_type = ICMP_ECHO_REPLY
+        else:
+            reply_type = ICMP6_ECHO_REPLY
+        if len(data) < 8:
+            return
+        icmp_type, _code, _csum, ident, seq = struct.unpack("!BBHHH", data[:8])
+        if icmp_type != reply_type:
+            return
+        if s.ident is not None and ident != s.ident:
+            return
+        waiter = self._pending.pop((addr[0], seq), None)
+        if waiter is None:
+            return
+        fut, sent_at = waiter
+        if not fut.done():
+            fut.set_result((received_at - sent_at) * 1000.0)
+
+    def _send(self, s: _IcmpSocket, address: str, seq: int) -> None:
+        request_type = ICMP_ECHO_REQUEST if s.family == socket.AF_INET else ICMP6_ECHO_REQUEST
+        payload = struct.pack("!d", time.time()) + b"server-check".ljust(48, b"\x00")
+        header = struct.pack("!BBHHH", request_type, 0, 0, s.ident or 0, seq)
+        # ICMPv4 carries its own checksum; for ICMPv6 the kernel fills it in (it covers the IPv6 pseudo-header)
+        if s.family == socket.AF_INET:
+            header = struct.pack("!BBHHH", request_type, 0, _checksum(header + payload), s.ident or 0, seq)
+        s.sock.sendto(header + payload, (address, 0))
+
+    async def _resolve(self, host: str) -> Optional[Tuple[int, str]]:
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(host, None, type=socket.SOCK_RAW)
+        except (socket.gaierror, UnicodeError):
+            return None
+        # Prefer IPv4 when a name resolves to both families
+        infos.sort(key=lambda i: 0 if i[0] == socket.AF_INET else 1)
+        for family, _type, _proto, _canon, sockaddr in infos:
+            if family in (socket.AF_INET, socket.AF_INET6):
+                return family, sockaddr[0]
+        return None
+
+    async def _echo(self, family: int, address: str, timeout: float) -> Optional[float]:
+        try:
+            s = self._socket(family)
+        except OSError as e:
+            # No permission for datagram or raw ICMP sockets on this host
+            if family not in self._denied:
+                self._denied.add(family)
+                logger.warning("cannot open an ICMP socket (%s); hosts will show as unreachable", e)
+            return None
+        loop = asyncio.get_running_loop()
+        seq = self._next_seq()
+        key = (address, seq)
+        fut = loop.create_future()
+        self._pending[key] = (fut, time.perf_counter())
+        try:
+            self._send(s, address, seq)
+            return await asyncio.wait_for(fut, timeout)
+        except (asyncio.TimeoutError, OSError):
+            return None
+        finally:
+            self._pending.pop(key, None)
+
+    async def ping(self, host: str, count: int = 1, timeout: float = 1.0, interval: float = 0.2) -> PingResult:
+        """Send `count` echo requests to one host; each waits at most `timeout` seconds"""
+        result = PingResult(host=host)
+        resolved = await self._resolve(host)
+        if resolved is None:
+            result.sent = count
+            return result
+        family, address = resolved
+        waits = []
+        for i in range(count):
+            if i:
+                await asyncio.sleep(interval)
+            waits.append(asyncio.ensure_future(self._echo(family, address, timeout)))
+        rtts = await asyncio.gather(*waits)
+        result.sent = count
+        rtts = [r for r in rtts if r is not None]
+        result.received = len(rtts)
+        if rtts:
+            result.rtt_ms = sum(rtts) / len(rtts)
+        return result
+
+    async def ping_many(self, hosts: Iterable[str], count: int = 1, timeout: float = 1.0) -> Dict[str, PingResult]:
+        """Ping a whole fleet concurrently; the sweep takes about one timeout window"""
+        unique = list(dict.fromkeys(h for h in hosts if h))
+        results = await asyncio.gather(
+            *(self.ping(h, count=count, timeout=timeout) for h in unique),
+            return_exceptions=True,
+        )
+        out: Dict[str, PingResult] = {}
+        for host, res in zip(unique, results):
+            out[host] = res if isinstance(res, PingResult) else PingResult(host=host, sent=count)
+        return out
+
+
+# Shared prober used by the monitor
+prober = IcmpProber()
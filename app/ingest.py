@@ -0,0 +1,110 @@
+from collections import namedtuple
+from typing import Dict, Iterable, List, Sequence, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models import Metric, MetricLatest, metric_rollups, check_results
+from app.rollups import ROLLUP_COLUMNS, ROLLUP_UPSERT, rollup_rows
+from app.checks import CHECK_RESULT_COLUMNS, check_result_rows
+from app.transitions import record_transitions
+from app import deadband, partitions
+
+
+# Metric columns written by the ingest path, in tuple order
+METRIC_COLUMNS: Tuple[str, ...] = (
+    "server_id", "timestamp", "cpu_percent", "cpu_temp", "ram_percent", "swap_percent",
+    "disk_percent", "disk_io_read", "disk_io_write", "processes", "network_in_kbps",
+    "network_out_kbps", "reachable", "ping_rtt_ms", "packet_loss", "services_status",
+    "ports_status", "ports_latency", "probe_status", "probe_duration_ms",
+)
+_POSITIONS: Dict[str, int] = {name: i for i, name in enumerate(METRIC_COLUMNS)}
+
+# A metric row read back as plain values (archive blocks, expanded deadband rows)
+MetricRow = namedtuple("MetricRow", METRIC_COLUMNS)
+
+
+def metric_row(r: Dict) -> tuple:
+    """Probe result dict -> plain tuple in METRIC_COLUMNS order"""
+    return (
+        r["server_id"], r["timestamp"], r["cpu"], r["cpu_temp"], r["ram"], r["swap"],
+        r["disk"], r["disk_read"], r["disk_write"], r["processes"], r["in_kbps"],
+        r["out_kbps"], r["reachable"], r["ping_rtt_ms"], r["packet_loss"], r["services_status"],
+        r["ports_status"], r.get("ports_latency"), r.get("probe_status"), r.get("probe_duration_ms"),
+    )
+
+
+def _placeholder(paramstyle: str, position: int) -> str:
+    if paramstyle == "qmark":
+        return "?"
+    if paramstyle == "numeric":
+        return f":{position}"
+    return "%s"  # format / pyformat
+
+
+async def insert_rows(db: AsyncSession, table, columns: Sequence[str], rows: Iterable[tuple], chunk_size: int | None = None, suffix: str = "") -> int:
+    """Chunked executemany of plain tuples, bypassing ORM unit-of-work bookkeeping.
+
+    Values go through each column type's bind processor, so they are stored
+    exactly as the ORM would store them. `suffix` is appended to the INSERT
+    (e.g. an ON CONFLICT clause). Does not commit.
+    """
+    if chunk_size is None:
+        chunk_size = settings.ingest_chunk_size
+    conn = await db.connection()
+    dialect = conn.dialect
+    processors = [table.c[name].type.dialect_impl(dialect).bind_processor(dialect) for name in columns]
+    placeholders = ", ".join(_placeholder(dialect.paramstyle, i + 1) for i in range(len(columns)))
+    sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({placeholders}){suffix}"
+
+    total = 0
+    chunk: List[tuple] = []
+    for row in rows:
+        chunk.append(tuple(p(v) if p is not None and v is not None else v for p, v in zip(processors, row)))
+        if len(chunk) >= chunk_size:
+            await conn.exec_driver_sql(sql, chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        await conn.exec_driver_sql(sql, chunk)
+        total += len(chunk)
+    return total
+
+
+# Upsert into metrics_latest; the timestamp guard keeps the newest row when a batch holds several per server
+_LATEST_UPSERT = (
+    " ON CONFLICT (server_id) DO UPDATE SET "
+    + ", ".join(f"{name} = excluded.{name}" for name in METRIC_COLUMNS if name != "server_id")
+    + f" WHERE excluded.timestamp >= {MetricLatest.__tablename__}.timestamp"
+)
+
+
+async def insert_metrics(db: AsyncSession, rows: Iterable[tuple], chunk_size: int | None = None) -> int:
+    """Bulk insert metric tuples (see METRIC_COLUMNS / metric_row) into their day partitions;
+    metrics_latest, the rollup tiers, check_results and the state interval log are updated in the
+    same transaction. Does not commit."""
+    rows = list(rows)
+    stored, columns = rows, METRIC_COLUMNS
+    if deadband.rules(METRIC_COLUMNS):
+        stored, columns = deadband.apply(db, rows, METRIC_COLUMNS), METRIC_COLUMNS + (deadband.HELD_COLUMN,)
+    total = 0
+    for day, day_rows in partitions.route(stored, _POSITIONS["timestamp"]).items():
+        table = await partitions.ensure_partition(db, day)
+        total += await insert_rows(db, table, columns, day_rows, chunk_size)
+    await insert_rows(db, MetricLatest.__table__, METRIC_COLUMNS, rows, chunk_size, suffix=_LATEST_UPSERT)
+    await insert_rows(db, metric_rollups, ROLLUP_COLUMNS, rollup_rows(rows, _POSITIONS), chunk_size, suffix=ROLLUP_UPSERT)
+    await insert_rows(db, check_results, CHECK_RESULT_COLUMNS, await check_result_rows(db, rows, _POSITIONS), chunk_size,
+                      suffix=" ON CONFLICT DO NOTHING")
+    await record_transitions(db, rows, _POSITIONS)
+    return total
+
+
+async def backfill_latest(conn) -> None:
+    """Fill an empty metrics_latest from the metrics history (one-off, at startup)"""
+    if (await conn.exec_driver_sql(f"SELECT 1 FROM {MetricLatest.__tablename__} LIMIT 1")).first():
+        return
+    columns = ", ".join(METRIC_COLUMNS)
+    await conn.exec_driver_sql(
+        f"INSERT OR IGNORE INTO {MetricLatest.__tablename__} ({columns}) "
+        f"SELECT {', '.join('m.' + c for c in METRIC_COLUMNS)} FROM {Metric.__tablename__} m "
+        f"JOIN (SELECT server_id, MAX(timestamp) AS ts FROM {Metric.__tablename__} GROUP BY server_id) l "
+        f"ON m.server_id = l.server_id AND m.timestamp = l.ts"
+    )
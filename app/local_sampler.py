@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import psutil
+from app.config import settings
+
+
+@dataclass
+class _Snapshot:
+    at: float  # time.monotonic()
+    cpu_busy: float
+    cpu_total: float
+    net_recv: int
+    net_sent: int
+    disk_read: int
+    disk_write: int
+
+
+def _cpu_temp() -> Optional[float]:
+    """CPU temperature in Celsius (Linux only)"""
+    try:
+        if hasattr(psutil, "sensors_temperatures"):
+            temps = psutil.sensors_temperatures()
+            if temps:
+                for name, entries in temps.items():
+                    if 'core' in name.lower() or 'cpu' in name.lower():
+                        for entry in entries:
+                            if entry.current is not None:
+                                return entry.current
+    except Exception:
+        pass
+    return None
+
+
+def _take_snapshot() -> _Snapshot:
+    times = psutil.cpu_times()
+    total = sum(times)
+    # Same definition of idle time as psutil.cpu_percent()
+    idle = times.idle + getattr(times, "iowait", 0.0)
+    net = psutil.net_io_counters()
+    disk = psutil.disk_io_counters()
+    return _Snapshot(
+        at=time.monotonic(),
+        cpu_busy=total - idle,
+        cpu_total=total,
+        net_recv=net.bytes_recv if net else 0,
+        net_sent=net.bytes_sent if net else 0,
+        disk_read=disk.read_bytes if disk else 0,
+        disk_write=disk.write_bytes if disk else 0,
+    )
+
+
+class LocalSampler:
+    """Long-lived task keeping rolling psutil counter snapshots of this host.
+
+    Rates (CPU, network, disk I/O) are derived from the last two samples, so
+    reading them never sleeps.
+    """
+
+    def __init__(self, resolution_seconds: float = 1.0):
+        self.resolution_seconds = resolution_seconds
+        self._samples: deque = deque(maxlen=2)
+        self._cpu_temp: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._sample()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _sample(self):
+        try:
+            self._samples.append(_take_snapshot())
+            self._cpu_temp = _cpu_temp()
+        except Exception:
+            pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.resolution_seconds)
+            self._sample()
+
+    def rates(self) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float], Optional[float]]:
+        """(cpu %, net in kbps, net out kbps, disk read MB/s, disk write MB/s) from the last two samples"""
+        if len(self._samples) < 2:
+            return None, None, None, None, None
+        prev, last = self._samples[0], self._samples[1]
+        elapsed = last.at - prev.at
+        if elapsed <= 0:
+            return None, None, None, None, None
+        total = last.cpu_total - prev.cpu_total
+        cpu = round(max(0.0, min(100.0, (last.cpu_busy - prev.cpu_busy) / total * 100.0)), 1) if total > 0 else 0.0
+        in_kbps = max(0, last.net_recv - prev.net_recv) * 8 / 1024 / elapsed
+        out_kbps = max(0, last.net_sent - prev.net_sent) * 8 / 1024 / elapsed
+        read_mb = max(0, last.disk_read - prev.disk_read) / (1024 * 1024) / elapsed
+        write_mb = max(0, last.disk_write - prev.disk_write) / (1024 * 1024) / elapsed
+        return cpu, in_kbps, out_kbps, read_mb, write_mb
+
+    @property
+    def cpu_temp(self) -> Optional[float]:
+        return self._cpu_temp
+
+
+# Shared sampler for localhost targets
+local_sampler = LocalSampler(settings.local_sample_resolution_seconds)
@@ -3,11 +3,21 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.templating import Jinja2Templates
-from app.database import Base, engine, AsyncSessionLocal
+from app.database import Base, engine, AsyncSessionLocal, ReadSessionLocal
+from app.db_writer import db_writer
+from app.ingest import backfill_latest
+from app.fleet_state import fleet_state
+from app.rollups import backfill_rollups, rollup_loop
+from app.archive import archive_loop
 from starlette.middleware.authentication import AuthenticationMiddleware
 from app.security import SessionAuthBackend
 from app.routers import router
-from app.monitor import monitor_loop, retention_job
+from app.monitor import build_scheduler
+from app.retention import retention_engine
+from app.broadcaster import broadcaster
+from app.local_sampler import local_sampler
+from app.ssh_pool import ssh_pool
+from app.snmp_poller import snmp_poller
 from app.config import settings
 from app.models import User, UserRole
 from app.csrf import CSRFMiddleware
@@ -75,6 +85,8 @@ async def on_startup():
             await conn.exec_driver_sql("ALTER TABLE servers ADD COLUMN services_to_monitor VARCHAR(1000)")
         if "ports_to_monitor" not in cols2:
             await conn.exec_driver_sql("ALTER TABLE servers ADD COLUMN ports_to_monitor VARCHAR(1000)")
+        if "monitor_interval" not in cols2:
+            await conn.exec_driver_sql("ALTER TABLE servers ADD COLUMN monitor_interval INTEGER")
         
         # ensure metrics new columns exist
         res3 = await conn.exec_driver_sql("PRAGMA table_info(metrics)")
@@ -91,6 +103,24 @@ async def on_startup():
             await conn.exec_driver_sql("ALTER TABLE metrics ADD COLUMN services_status VARCHAR(1000)")
         if "ports_status" not in cols3:
             await conn.exec_driver_sql("ALTER TABLE metrics ADD COLUMN ports_status VARCHAR(1000)")
+        if "ports_latency" not in cols3:
+            await conn.exec_driver_sql("ALTER TABLE metrics ADD COLUMN ports_latency VARCHAR(1000)")
+        if "ping_rtt_ms" not in cols3:
+            await conn.exec_driver_sql("ALTER TABLE metrics ADD COLUMN ping_rtt_ms FLOAT")
+        if "packet_loss" not in cols3:
+            await conn.exec_driver_sql("ALTER TABLE metrics ADD COLUMN packet_loss FLOAT")
+        if "probe_status" not in cols3:
+            await conn.exec_driver_sql("ALTER TABLE metrics ADD COLUMN probe_status VARCHAR(20)")
+        if "probe_duration_ms" not in cols3:
+            await conn.exec_driver_sql("ALTER TABLE metrics ADD COLUMN probe_duration_ms FLOAT")
+        if "held" not in cols3:
+            await conn.exec_driver_sql("ALTER TABLE metrics ADD COLUMN held INTEGER")
+        # day partitions created before the deadband column existed
+        res_p = await conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'metrics_[0-9]*'")
+        for name in res_p.scalars().all():
+            cols_p = [row[1] for row in (await conn.exec_driver_sql(f"PRAGMA table_info({name})")).fetchall()]
+            if "held" not in cols_p:
+                await conn.exec_driver_sql(f"ALTER TABLE {name} ADD COLUMN held INTEGER")
         
         # ensure alert_rules new columns exist
         res4 = await conn.exec_driver_sql("PRAGMA table_info(alert_rules)")
@@ -100,6 +130,20 @@ async def on_startup():
         if "severity" not in cols4:
             await conn.exec_driver_sql("ALTER TABLE alert_rules ADD COLUMN severity VARCHAR(20) DEFAULT 'warning'")
 
+        # retention walks the archive by hour (index added after the table first shipped)
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_metric_archive_hour ON metric_archive (hour)")
+        # server list sort indexes (app/server_list.py) on databases created before them
+        # (expression indexes are invisible to reflection, so checkfirst cannot be used)
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_servers_hostname_sort ON servers (lower(hostname))")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_servers_ip_address ON servers (ip_address)")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_servers_system_sort ON servers (lower(coalesce(system_name, '')))")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_servers_environment_sort ON servers (coalesce(environment, ''))")
+
+        # metrics_latest is maintained on ingest; seed it once from existing history
+        await backfill_latest(conn)
+        # Rollup tiers are maintained on ingest too; build them once from existing history
+        await backfill_rollups(conn)
+
     # Ensure default admin exists for local login
     async with AsyncSessionLocal() as db:
         existing = (await db.execute(select(User).where(User.username == settings.admin_default_username))).scalar_one_or_none()
@@ -114,15 +158,35 @@ async def on_startup():
             db.add(admin)
             await db.commit()
 
-    # Start background monitor
-    asyncio.create_task(monitor_loop(AsyncSessionLocal))
-    # Start retention job (daily)
-    async def retention_scheduler():
-        while True:
-            await retention_job(AsyncSessionLocal)
-            # run once per day
-            await asyncio.sleep(24 * 60 * 60)
-    asyncio.create_task(retention_scheduler())
+    # Warm the in-memory fleet state so list views never wait on the database
+    async with ReadSessionLocal() as db:
+        await fleet_state.ensure_loaded(db)
+
+    # Start local psutil sampler before the first monitor cycle needs it
+    local_sampler.start()
+    # Idle eviction for pooled SSH connections
+    ssh_pool.start()
+    # Background writes (metrics, alert events, retention) go through one writer task
+    db_writer.start()
+    # Start background monitor (per-server scheduler)
+    app.state.scheduler = build_scheduler(ReadSessionLocal)
+    asyncio.create_task(app.state.scheduler.run())
+    # Refresh the 5-minute and 1-hour rollup tiers from the 1-minute tier
+    asyncio.create_task(rollup_loop())
+    # Pack day partitions older than archive_after_days into compressed hourly blocks
+    asyncio.create_task(archive_loop())
+    # Retention runs daily at RETENTION_RUN_AT (UTC), in throttled chunks
+    asyncio.create_task(retention_engine.run_forever())
+    # Fans monitor results out to /api/stream subscribers
+    asyncio.create_task(broadcaster.run())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await local_sampler.stop()
+    await ssh_pool.close_all()
+    snmp_poller.close()
+    await db_writer.stop()
 
 
 @app.get("/health")
@@ -1,6 +1,6 @@
 import enum
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float
+from sqlalchemy import func, literal_column, Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Table, Index, LargeBinary, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -46,6 +46,7 @@ class Server(Base):
     snmp_version = Column(String(10), nullable=True)  # v2c
     snmp_community = Column(String(500), nullable=True)  # Encrypted
     metric_source = Column(String(20), default="auto")  # auto|local|ssh|snmp
+    monitor_interval = Column(Integer, nullable=True)  # seconds; NULL uses the global interval
     # Service and port monitoring
     services_to_monitor = Column(String(1000), nullable=True)  # JSON string of services to monitor
     ports_to_monitor = Column(String(1000), nullable=True)  # JSON string of ports to monitor
@@ -53,6 +54,14 @@ class Server(Base):
 
     metrics = relationship("Metric", back_populates="server", cascade="all, delete-orphan")
 
+    # Sort keys of the server list (app/server_list.py); expressions must match the queries
+    __table_args__ = (
+        Index("ix_servers_hostname_sort", func.lower(hostname)),
+        Index("ix_servers_ip_address", ip_address),
+        Index("ix_servers_system_sort", func.lower(func.coalesce(system_name, literal_column("''")))),
+        Index("ix_servers_environment_sort", func.coalesce(environment, literal_column("''"))),
+    )
+
 
 class Metric(Base):
     __tablename__ = "metrics"
@@ -71,12 +80,121 @@ class Metric(Base):
     network_in_kbps = Column(Float, nullable=True)
     network_out_kbps = Column(Float, nullable=True)
     reachable = Column(Boolean, default=None)
+    ping_rtt_ms = Column(Float, nullable=True)  # Average ICMP round-trip time
+    packet_loss = Column(Float, nullable=True)  # ICMP packet loss percentage
+    probe_status = Column(String(20), nullable=True)  # ok|timeout|error
+    probe_duration_ms = Column(Float, nullable=True)
     services_status = Column(String(1000), nullable=True)  # JSON string of services status
     ports_status = Column(String(1000), nullable=True)  # JSON string of ports status
+    ports_latency = Column(String(1000), nullable=True)  # JSON string of TCP connect latency (ms) per port
+    held = Column(Integer, nullable=True)  # bitmask of values left out by the deadband (see app.deadband)
 
     server = relationship("Server", back_populates="metrics")
 
 
+class MetricLatest(Base):
+    """Latest metric per server, upserted together with every metric insert (same columns as Metric)"""
+    __tablename__ = "metrics_latest"
+
+    server_id = Column(Integer, ForeignKey("servers.id", ondelete="CASCADE"), primary_key=True)
+    timestamp = Column(DateTime, nullable=False)
+    cpu_percent = Column(Float, nullable=True)
+    cpu_temp = Column(Float, nullable=True)
+    ram_percent = Column(Float, nullable=True)
+    swap_percent = Column(Float, nullable=True)
+    disk_percent = Column(Float, nullable=True)
+    disk_io_read = Column(Float, nullable=True)
+    disk_io_write = Column(Float, nullable=True)
+    processes = Column(Integer, nullable=True)
+    network_in_kbps = Column(Float, nullable=True)
+    network_out_kbps = Column(Float, nullable=True)
+    reachable = Column(Boolean, default=None)
+    ping_rtt_ms = Column(Float, nullable=True)
+    packet_loss = Column(Float, nullable=True)
+    probe_status = Column(String(20), nullable=True)
+    probe_duration_ms = Column(Float, nullable=True)
+    services_status = Column(String(1000), nullable=True)
+    ports_status = Column(String(1000), nullable=True)
+    ports_latency = Column(String(1000), nullable=True)
+
+
+class MetricArchive(Base):
+    """Cold metrics: one compressed columnar block per server and hour (see app.archive)"""
+    __tablename__ = "metric_archive"
+    __table_args__ = (Index("ix_metric_archive_hour", "hour"),)
+
+    server_id = Column(Integer, primary_key=True)
+    hour = Column(Integer, primary_key=True)  # hour start, unix seconds (UTC)
+    samples = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+
+
+# Metric columns kept in the rollup tiers (reachable is rolled up as 0/1)
+ROLLUP_METRICS = (
+    "cpu_percent", "cpu_temp", "ram_percent", "swap_percent", "disk_percent", "disk_io_read",
+    "disk_io_write", "processes", "network_in_kbps", "network_out_kbps", "reachable",
+    "ping_rtt_ms", "packet_loss", "probe_duration_ms",
+)
+ROLLUP_AGGREGATES = ("min", "max", "sum", "count", "last")
+
+# One row per server, tier resolution and time bucket; avg = sum / count
+metric_rollups = Table(
+    "metric_rollups",
+    Base.metadata,
+    Column("server_id", Integer, primary_key=True),
+    Column("resolution", Integer, primary_key=True),  # seconds: 60 | 300 | 3600
+    Column("bucket", Integer, primary_key=True),  # bucket start, unix seconds (UTC)
+    Column("samples", Integer, nullable=False, default=0),
+    Column("last_ts", Float, nullable=False),  # unix time of the newest sample in the bucket
+    *(Column(f"{name}_{agg}", Float, nullable=agg not in ("sum", "count"))
+      for name in ROLLUP_METRICS for agg in ROLLUP_AGGREGATES),
+    Index("ix_metric_rollups_resolution_bucket", "resolution", "bucket"),
+)
+
+
+class Check(Base):
+    """Check dictionary: one row per monitored service or port name"""
+    __tablename__ = "checks"
+    __table_args__ = (UniqueConstraint("kind", "name"),)
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False)  # service | port
+    name = Column(String(255), nullable=False)
+
+
+# One row per check and probe, clustered by check and time so fleet-wide
+# lookups ("port 443 closed in the last hour") read a single key range
+check_results = Table(
+    "check_results",
+    Base.metadata,
+    Column("check_id", Integer, primary_key=True),
+    Column("timestamp", DateTime, primary_key=True),
+    Column("server_id", Integer, primary_key=True),
+    Column("ok", Boolean, nullable=False),
+    Column("latency_ms", Float, nullable=True),
+    Index("ix_check_results_server_ts", "server_id", "timestamp"),
+    Index("ix_check_results_failed", "check_id", "timestamp", sqlite_where=text("ok = 0")),
+    sqlite_with_rowid=False,
+)
+
+
+class StateInterval(Base):
+    """One stretch of unchanged state: host up/down, service active/inactive, port open/closed"""
+    __tablename__ = "state_intervals"
+    __table_args__ = (
+        Index("ix_state_intervals_subject", "server_id", "kind", "name", "started_at"),
+        Index("ix_state_intervals_ended_at", "ended_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    server_id = Column(Integer, nullable=False)
+    kind = Column(String(20), nullable=False)  # host | service | port
+    name = Column(String(255), nullable=False, default="")  # service name or port; empty for host
+    up = Column(Boolean, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=True)  # NULL while current
+
+
 class AlertGroup(Base):
     __tablename__ = "alert_groups"
 
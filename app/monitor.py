@@ -1,73 +1,58 @@
 import asyncio
+import json
 import time
 from datetime import datetime
 from typing import Dict, Tuple
 import psutil
-from pythonping import ping
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.models import Server, Metric, AlertRule, AlertEvent
+from app.models import Server, AlertRule, AlertEvent
 from app.config import settings
-from app.encryption import decrypt_password
 from app.services import MonitoringService
+from app.icmp import prober, PingResult
+from app.local_sampler import local_sampler
+from app.ssh_pool import ssh_pool
+from app import ssh_collector
+from app.snmp_poller import snmp_poller
+from app.scheduler import MonitorScheduler
+from app import port_checker
+from app import service_checker
+from app.ingest import insert_metrics, metric_row
+from app.db_writer import db_writer
+from app.fleet_state import fleet_state
+from app.broadcaster import broadcaster
 import smtplib
 from email.message import EmailMessage
 import httpx
 
 
 async def collect_local_metrics() -> Tuple[float, float, float, float, float, float, int, float, float, float, float]:
-    cpu = psutil.cpu_percent(interval=0.5)
+    # Rates come from the background sampler's last two snapshots, so this never sleeps
+    local_sampler.start()
+    cpu, in_kbps, out_kbps, disk_read_mb, disk_write_mb = local_sampler.rates()
     ram = psutil.virtual_memory().percent
     swap = psutil.swap_memory().percent
     disk = psutil.disk_usage('/').percent
     processes = len(psutil.pids())
-    
-    # Network I/O
-    net_io_1 = psutil.net_io_counters()
-    await asyncio.sleep(1)
-    net_io_2 = psutil.net_io_counters()
-    in_kbps = (net_io_2.bytes_recv - net_io_1.bytes_recv) * 8 / 1024
-    out_kbps = (net_io_2.bytes_sent - net_io_1.bytes_sent) * 8 / 1024
-    
-    # Disk I/O
-    disk_io_1 = psutil.disk_io_counters()
-    await asyncio.sleep(1)
-    disk_io_2 = psutil.disk_io_counters()
-    disk_read_mb = (disk_io_2.read_bytes - disk_io_1.read_bytes) / (1024 * 1024)
-    disk_write_mb = (disk_io_2.write_bytes - disk_io_1.write_bytes) / (1024 * 1024)
-    
-    # CPU Temperature (Linux only)
-    cpu_temp = None
-    try:
-        if hasattr(psutil, "sensors_temperatures"):
-            temps = psutil.sensors_temperatures()
-            if temps:
-                for name, entries in temps.items():
-                    if 'core' in name.lower() or 'cpu' in name.lower():
-                        for entry in entries:
-                            if entry.current is not None:
-                                cpu_temp = entry.current
-                                break
-                        if cpu_temp is not None:
-                            break
-    except Exception:
-        pass
+    cpu_temp = local_sampler.cpu_temp
     
     return cpu, cpu_temp, ram, swap, disk, disk_read_mb, disk_write_mb, processes, in_kbps, out_kbps
 
 
-async def _probe_server(server: Server):
-    reachable = False
+async def _probe_server(server: Server, ping_result: PingResult | None = None):
     cpu = cpu_temp = ram = swap = disk = disk_read = disk_write = in_kbps = out_kbps = None
     processes = None
     services_status = None
     ports_status = None
+    status = "ok"
     
-    try:
-        resp = ping(server.ip_address, count=1, timeout=settings.ping_timeout_seconds)
-        reachable = resp.success()
-    except Exception:
-        reachable = False
+    # monitor_once sweeps the whole fleet up front; ping here only for ad-hoc probes
+    if ping_result is None:
+        try:
+            ping_result = await prober.ping(server.ip_address, count=settings.ping_count, timeout=settings.ping_timeout_seconds)
+        except Exception:
+            ping_result = PingResult(host=server.ip_address, sent=settings.ping_count)
+    reachable = ping_result.reachable
 
     # Decide source preference
     source = (server.metric_source or "auto")
@@ -77,191 +62,66 @@ async def _probe_server(server: Server):
     if (source == "local" and is_local) or (source == "auto" and is_local):
         try:
             cpu, cpu_temp, ram, swap, disk, disk_read, disk_write, processes, in_kbps, out_kbps = await collect_local_metrics()
-            
-            # Check services status
-            if server.services_to_monitor:
-                try:
-                    import json
-                    services_list = json.loads(server.services_to_monitor)
-                    services_status = {}
-                    for service in services_list:
-                        try:
-                            # Check if service is running (Linux)
-                            import subprocess
-                            result = subprocess.run(['systemctl', 'is-active', service], 
-                                                  capture_output=True, text=True, timeout=5)
-                            services_status[service] = result.stdout.strip() == 'active'
-                        except Exception:
-                            services_status[service] = False
-                    services_status = json.dumps(services_status)
-                except Exception:
-                    pass
-            
-            # Check ports status
-            if server.ports_to_monitor:
+
+            # All monitored services in one async systemctl call
+            services = service_checker.parse_services(server.services_to_monitor)
+            if services:
                 try:
-                    import json
-                    import socket
-                    ports_list = json.loads(server.ports_to_monitor)
-                    ports_status = {}
-                    for port in ports_list:
-                        try:
-                            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                            sock.settimeout(2)
-                            result = sock.connect_ex(('127.0.0.1', int(port)))
-                            ports_status[str(port)] = result == 0
-                            sock.close()
-                        except Exception:
-                            ports_status[str(port)] = False
-                    ports_status = json.dumps(ports_status)
+                    services_status = await service_checker.check_local(services, settings.service_check_timeout)
+                except asyncio.TimeoutError:
+                    raise
                 except Exception:
-                    pass
-                    
+                    # systemctl unavailable: report every service as not active
+                    services_status = {service: False for service in services}
+                services_status = json.dumps(services_status)
+        except asyncio.TimeoutError:
+            status = "timeout"
         except Exception:
-            pass
+            status = "error"
     # SSH metrics (forced or auto when ssh configured)
     elif (source == "ssh") or (source == "auto" and server.ssh_host and server.ssh_username):
         try:
-            import asyncssh  # lightweight alternative to paramiko in async
-            ssh_password = decrypt_password(server.ssh_password) if server.ssh_password else None
-            async with asyncssh.connect(server.ssh_host, port=server.ssh_port or 22, username=server.ssh_username, password=ssh_password, known_hosts=None) as conn:
-                cpu_out = await conn.run("LANG=C top -bn1 | grep 'Cpu' | awk '{print 100-$8}'", check=False)
-                ram_out = await conn.run("free -m | awk 'NR==2{printf \"%.2f\", $3*100/$2 }'", check=False)
-                disk_out = await conn.run("df -h / | awk 'NR==2{gsub(/%/,\"\",$5); print $5}'", check=False)
-                ps_out = await conn.run("ps -e --no-headers | wc -l", check=False)
-                try:
-                    cpu = float(cpu_out.stdout.strip()) if cpu_out.stdout else None
-                except Exception:
-                    cpu = None
-                try:
-                    ram = float(ram_out.stdout.strip()) if ram_out.stdout else None
-                except Exception:
-                    ram = None
-                try:
-                    disk = float(disk_out.stdout.strip()) if disk_out.stdout else None
-                except Exception:
-                    disk = None
-                try:
-                    processes = int(ps_out.stdout.strip()) if ps_out.stdout else None
-                except Exception:
-                    processes = None
+            # Single exec reading /proc; rates come from the delta to the previous cycle
+            # Service states ride along in the same exec
+            services = service_checker.parse_services(server.services_to_monitor)
+            command = ssh_collector.collect_command(services)
+            out = await asyncio.wait_for(ssh_pool.run(server, command, check=False), settings.ssh_timeout)
+            if out.stdout:
+                payload = ssh_collector.parse_payload(out.stdout, services)
+                if services:
+                    services_status = json.dumps(payload["services"])
+                m = ssh_collector.compute_metrics(server.id, payload)
+                cpu, cpu_temp, ram, swap, disk = m["cpu"], m["cpu_temp"], m["ram"], m["swap"], m["disk"]
+                disk_read, disk_write, processes = m["disk_read"], m["disk_write"], m["processes"]
+                in_kbps, out_kbps = m["in_kbps"], m["out_kbps"]
+        except asyncio.TimeoutError:
+            status = "timeout"
         except Exception:
-            pass
+            status = "error"
     # SNMP metrics (forced or auto when snmp configured)
     elif (source == "snmp") or (source == "auto" and server.snmp_version == "v2c" and server.snmp_community and server.ip_address):
         try:
-            from pysnmp.hlapi.asyncio import (SnmpEngine, CommunityData, UdpTransportTarget,
-                                              ContextData, ObjectType, ObjectIdentity, getCmd, bulkCmd)
-
-            engine = SnmpEngine()
-            target = UdpTransportTarget((server.ip_address, 161), timeout=1.5, retries=0)
-            snmp_community = decrypt_password(server.snmp_community) if server.snmp_community else "public"
-            community = CommunityData(snmp_community, mpModel=1)
-            ctx = ContextData()
-
-            # Processes: hrSystemProcesses.0
-            errInd, errStat, errIdx, varBinds = await getCmd(
-                engine, community, target, ctx,
-                ObjectType(ObjectIdentity('1.3.6.1.2.1.25.1.6.0'))
-            )
-            if (not errInd) and (not errStat):
-                try:
-                    processes = int(varBinds[0][1])
-                except Exception:
-                    processes = processes
-
-            # CPU: hrProcessorLoad 1.3.6.1.2.1.25.3.3.1.2 - average across instances
-            cpu_values = []
-            async for (errInd2, errStat2, errIdx2, varBinds2) in bulkCmd(
-                engine, community, target, ctx, 0, 10,
-                ObjectType(ObjectIdentity('1.3.6.1.2.1.25.3.3.1.2')),
-                lexicographicMode=False
-            ):
-                if errInd2 or errStat2:
-                    break
-                for name, val in varBinds2:
-                    oid = str(name)
-                    if not oid.startswith('1.3.6.1.2.1.25.3.3.1.2'):
-                        continue
-                    try:
-                        cpu_values.append(float(val))
-                    except Exception:
-                        pass
-            if cpu_values:
-                cpu = sum(cpu_values) / len(cpu_values)
-
-            # Storage: hrStorageTable 1.3.6.1.2.1.25.2.3
-            # Types: hrStorageType 1.3.6.1.2.1.25.2.3.1.2
-            # AllocationUnits: 1.3.6.1.2.1.25.2.3.1.4, Size: ...1.5, Used: ...1.6
-            hrStorageType = '1.3.6.1.2.1.25.2.3.1.2'
-            hrAllocUnits = '1.3.6.1.2.1.25.2.3.1.4'
-            hrSize = '1.3.6.1.2.1.25.2.3.1.5'
-            hrUsed = '1.3.6.1.2.1.25.2.3.1.6'
-            # type OIDs
-            hrStorageRam = '1.3.6.1.2.1.25.2.1.2'
-            hrStorageFixedDisk = '1.3.6.1.2.1.25.2.1.4'
-
-            storage = {}
-            async for (e3, s3, i3, binds3) in bulkCmd(engine, community, target, ctx, 0, 25,
-                                                      ObjectType(ObjectIdentity(hrStorageType)),
-                                                      ObjectType(ObjectIdentity(hrAllocUnits)),
-                                                      ObjectType(ObjectIdentity(hrSize)),
-                                                      ObjectType(ObjectIdentity(hrUsed)),
-                                                      lexicographicMode=False):
-                if e3 or s3:
-                    break
-                # binds3 is a list of varBinds for multiple columns
-                # normalize rows by index suffix
-                for name, val in binds3:
-                    oid = str(name)
-                    if oid.startswith(hrStorageType):
-                        idx = oid[len(hrStorageType)+1:]
-                        storage.setdefault(idx, {})['type'] = str(val)
-                    elif oid.startswith(hrAllocUnits):
-                        idx = oid[len(hrAllocUnits)+1:]
-                        storage.setdefault(idx, {})['au'] = int(val)
-                    elif oid.startswith(hrSize):
-                        idx = oid[len(hrSize)+1:]
-                        storage.setdefault(idx, {})['size'] = int(val)
-                    elif oid.startswith(hrUsed):
-                        idx = oid[len(hrUsed)+1:]
-                        storage.setdefault(idx, {})['used'] = int(val)
-            # compute RAM and Disk percents
-            ram_percent = None
-            disk_percent = None
-            # RAM: pick the hrStorageRam row
-            for idx, row in storage.items():
-                if row.get('type') and row['type'].endswith(hrStorageRam):
-                    try:
-                        total = row['size'] * row['au']
-                        used = row['used'] * row['au']
-                        if total > 0:
-                            ram_percent = (used / total) * 100.0
-                    except Exception:
-                        pass
-                    break
-            # Disk: aggregate fixed disks
-            total_disk = 0
-            used_disk = 0
-            for idx, row in storage.items():
-                if row.get('type') and row['type'].endswith(hrStorageFixedDisk):
-                    try:
-                        total_disk += row['size'] * row['au']
-                        used_disk += row['used'] * row['au']
-                    except Exception:
-                        pass
-            if total_disk > 0:
-                disk_percent = (used_disk / total_disk) * 100.0
-
-            if ram_percent is not None:
-                ram = ram_percent
-            if disk_percent is not None:
-                disk = disk_percent
+            m = await asyncio.wait_for(snmp_poller.collect(server), settings.snmp_timeout)
+            cpu, ram, disk, processes = m["cpu"], m["ram"], m["disk"], m["processes"]
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except Exception:
+            status = "error"
+
+    # Port checks run against the server's own address, whatever the metric source
+    ports_latency = None
+    if server.ports_to_monitor:
+        try:
+            ports_list = json.loads(server.ports_to_monitor)
+            open_by_port, ports_latency = await port_checker.check_ports(server.ip_address, ports_list)
+            ports_status = json.dumps(open_by_port)
+            ports_latency = json.dumps(ports_latency)
         except Exception:
             pass
 
     return {
         "server_id": server.id,
+        "timestamp": datetime.utcnow(),
         "cpu": cpu,
         "cpu_temp": cpu_temp,
         "ram": ram,
@@ -273,39 +133,95 @@ async def _probe_server(server: Server):
         "in_kbps": in_kbps,
         "out_kbps": out_kbps,
         "reachable": reachable,
+        "ping_rtt_ms": ping_result.rtt_ms,
+        "packet_loss": ping_result.loss * 100.0,
         "services_status": services_status,
         "ports_status": ports_status,
+        "ports_latency": ports_latency,
+        "probe_status": status,
     }
 
 
+def _timeout_result(server: Server, ping_result: PingResult) -> Dict:
+    """Result for a probe cut off by the overall deadline: only the ICMP part is known"""
+    return {
+        "server_id": server.id,
+        "timestamp": datetime.utcnow(),
+        "cpu": None, "cpu_temp": None, "ram": None, "swap": None, "disk": None,
+        "disk_read": None, "disk_write": None, "processes": None, "in_kbps": None, "out_kbps": None,
+        "reachable": ping_result.reachable,
+        "ping_rtt_ms": ping_result.rtt_ms,
+        "packet_loss": ping_result.loss * 100.0,
+        "services_status": None,
+        "ports_status": None,
+        "ports_latency": None,
+        "probe_status": "timeout",
+    }
+
+
+async def _probe_with_deadline(server: Server, ping_result: PingResult) -> Dict:
+    started = time.monotonic()
+    try:
+        result = await asyncio.wait_for(_probe_server(server, ping_result), settings.probe_deadline_seconds)
+    except asyncio.TimeoutError:
+        result = _timeout_result(server, ping_result)
+    result["probe_duration_ms"] = round((time.monotonic() - started) * 1000.0, 1)
+    return result
+
+
+async def probe_with_ping(server: Server, sem: asyncio.Semaphore):
+    # ICMP shares one socket for all servers, so it runs outside the concurrency limit
+    try:
+        ping_result = await prober.ping(server.ip_address, count=settings.ping_count, timeout=settings.ping_timeout_seconds)
+    except Exception:
+        ping_result = PingResult(host=server.ip_address, sent=settings.ping_count)
+    async with sem:
+        return await _probe_with_deadline(server, ping_result)
+
+
+async def store_results(db: AsyncSession, results):
+    # Core-level bulk insert; ORM objects per row cost more than the insert itself
+    rows = [metric_row(r) for r in results]
+    await insert_metrics(db, rows)
+    await db.commit()
+    fleet_state.update_metrics(rows)
+    _stored(rows)
+
+
+def _stored(rows):
+    # Only committed rows are announced: live subscribers fetch history right away
+    fleet_state.mark_stored(rows)
+    broadcaster.notify(row[0] for row in rows)
+
+
+db_writer.on_commit(insert_metrics, _stored)
+
+
+def queue_results(results):
+    """Hand results to the writer task; it merges them with other queued writes"""
+    rows = [metric_row(r) for r in results]
+    db_writer.add_rows(insert_metrics, rows)
+    # Readers of the current state see the result right away, not after the batch commits
+    fleet_state.update_metrics(rows)
+
+
 async def monitor_once(db: AsyncSession):
+    """Probe every server once and store the results (one-off full sweep)"""
     servers = (await db.execute(select(Server))).scalars().all()
     sem = asyncio.Semaphore(settings.max_concurrency)
 
+    # One ICMP sweep for the whole fleet, outside the concurrency limit
+    pings = await prober.ping_many(
+        (s.ip_address for s in servers), count=settings.ping_count, timeout=settings.ping_timeout_seconds
+    )
+
     async def wrapped(s: Server):
         async with sem:
-            return await _probe_server(s)
+            ping_result = pings.get(s.ip_address) or PingResult(host=s.ip_address, sent=settings.ping_count)
+            return await _probe_with_deadline(s, ping_result)
 
     results = await asyncio.gather(*(wrapped(s) for s in servers), return_exceptions=False)
-    for r in results:
-        metric = Metric(
-            server_id=r["server_id"],
-            cpu_percent=r["cpu"],
-            cpu_temp=r["cpu_temp"],
-            ram_percent=r["ram"],
-            swap_percent=r["swap"],
-            disk_percent=r["disk"],
-            disk_io_read=r["disk_read"],
-            disk_io_write=r["disk_write"],
-            processes=r["processes"],
-            network_in_kbps=r["in_kbps"],
-            network_out_kbps=r["out_kbps"],
-            reachable=r["reachable"],
-            services_status=r["services_status"],
-            ports_status=r["ports_status"],
-        )
-        db.add(metric)
-    await db.commit()
+    await store_results(db, results)
 
 
 def _compare(op: str, value: float | None, threshold: float | None) -> bool:
@@ -324,23 +240,13 @@ async def evaluate_alerts(db: AsyncSession):
     await MonitoringService.evaluate_alerts_optimized(db)
 
 
-async def monitor_loop(db_factory, interval_seconds: int | None = None):
-    if interval_seconds is None:
-        interval_seconds = settings.monitor_interval_seconds
-    while True:
-        async with db_factory() as db:
-            await monitor_once(db)
-            await evaluate_alerts(db)
-        await asyncio.sleep(interval_seconds)
+def build_scheduler(db_factory) -> MonitorScheduler:
+    return MonitorScheduler(db_factory, probe=probe_with_ping, store=queue_results, evaluate=evaluate_alerts)
 
 
-async def retention_job(db_factory):
-    from datetime import datetime, timedelta
-    cutoff = datetime.utcnow() - timedelta(days=settings.retention_days)
-    from sqlalchemy import delete as sqldelete
-    async with db_factory() as db:
-        await db.execute(sqldelete(Metric).where(Metric.timestamp < cutoff))
-        await db.commit()
+async def monitor_loop(db_factory):
+    """Run the per-server probe scheduler forever"""
+    await build_scheduler(db_factory).run()
 
 
 def format_telegram_message(message: str) -> str:
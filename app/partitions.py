@@ -0,0 +1,139 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import Column, Index, MetaData, Table, and_, event, literal_column, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models import Metric
+
+
+# Raw metrics live in one table per UTC day: metrics_YYYYMMDD. Expiry drops
+# whole tables instead of deleting rows. The old single `metrics` table is
+# read alongside the partitions until its rows have aged out.
+LEGACY_TABLE = Metric.__tablename__
+_NAME = re.compile(r"^metrics_(\d{8})$")
+
+_metadata = MetaData()
+_tables: Dict[date, Table] = {}
+_created: Set[date] = set()  # partitions known to exist in the database (committed)
+_PENDING = "partitions"  # session.info key: partitions created by the current transaction
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        _created.update(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+def partition_name(day: date) -> str:
+    return f"{LEGACY_TABLE}_{day:%Y%m%d}"
+
+
+def partition_table(day: date) -> Table:
+    """Table object for one day's partition (same columns as metrics)"""
+    table = _tables.get(day)
+    if table is None:
+        name = partition_name(day)
+        table = Table(
+            name, _metadata,
+            *(Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in Metric.__table__.columns),
+            Index(f"ix_{name}_server_ts", "server_id", "timestamp"),
+        )
+        _tables[day] = table
+    return table
+
+
+async def list_partitions(db: AsyncSession) -> List[date]:
+    """Partition days present in the database, oldest first"""
+    conn = await db.connection()
+    names = (await conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'metrics_[0-9]*'"
+    )).scalars().all()
+    days = []
+    for name in names:
+        match = _NAME.match(name)
+        if match:
+            days.append(datetime.strptime(match.group(1), "%Y%m%d").date())
+    return sorted(days)
+
+
+async def ensure_partition(db: AsyncSession, day: date) -> Table:
+    """Create the day's partition on first use. Runs inside the caller's transaction;
+    the day is remembered once that transaction commits (a rollback undoes the CREATE)."""
+    table = partition_table(day)
+    pending: Set[date] = db.info.setdefault(_PENDING, set())
+    if day not in _created and day not in pending:
+        conn = await db.connection()
+        await conn.run_sync(lambda sync_conn: table.create(sync_conn, checkfirst=True))
+        pending.add(day)
+    return table
+
+
+def route(rows: Iterable[tuple], timestamp_pos: int) -> Dict[date, List[tuple]]:
+    """Group metric rows by the day partition their timestamp falls into"""
+    by_day: Dict[date, List[tuple]] = {}
+    for row in rows:
+        by_day.setdefault(row[timestamp_pos].date(), []).append(row)
+    return by_day
+
+
+async def range_select(db: AsyncSession, columns: List[str], where, since: datetime, until: Optional[datetime] = None):
+    """UNION ALL over the partitions overlapping [since, until] plus the legacy table.
+
+    `where(table)` returns the per-table filter (the time range is added here).
+    """
+    until_day = (until or datetime.utcnow()).date()
+    days = [d for d in await list_partitions(db) if since.date() <= d <= until_day]
+    sources = [partition_table(d) for d in days]
+    if await _legacy_has_rows(db, since):
+        sources.append(Metric.__table__)
+
+    selects = []
+    for table in sources:
+        condition = and_(where(table), table.c.timestamp >= since)
+        if until is not None:
+            condition = and_(condition, table.c.timestamp <= until)
+        selects.append(select(*(table.c[name] for name in columns)).where(condition))
+    if not selects:
+        return None
+    if len(selects) == 1:
+        return selects[0].subquery()
+    return union_all(*selects).subquery()
+
+
+# Cleared once the legacy table has no rows left in any window
+_legacy_empty = False
+
+
+async def _legacy_has_rows(db: AsyncSession, since: datetime) -> bool:
+    global _legacy_empty
+    if _legacy_empty:
+        return False
+    table = Metric.__table__
+    if (await db.execute(select(literal_column("1")).select_from(table).limit(1))).first() is None:
+        _legacy_empty = True
+        return False
+    return (await db.execute(select(literal_column("1")).select_from(table).where(table.c.timestamp >= since).limit(1))).first() is not None
+
+
+async def drop_expired(db: AsyncSession, cutoff: datetime) -> List[str]:
+    """Drop partitions lying entirely before cutoff. Does not commit."""
+    dropped = []
+    for day in await list_partitions(db):
+        if day + timedelta(days=1) <= cutoff.date():
+            await drop_partition(db, day)
+            dropped.append(partition_name(day))
+    return dropped
+
+
+async def drop_partition(db: AsyncSession, day: date):
+    """Drop one day's partition. Does not commit."""
+    conn = await db.connection()
+    await conn.exec_driver_sql(f"DROP TABLE IF EXISTS {partition_name(day)}")
+    _created.discard(day)
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from typing import Dict, Iterable, Optional, Tuple
+from app.config import settings
+
+
+# Caps TCP connects in flight across all servers
+_connect_slots: Optional[asyncio.Semaphore] = None
+
+
+def _slots() -> asyncio.Semaphore:
+    global _connect_slots
+    if _connect_slots is None:
+        _connect_slots = asyncio.Semaphore(settings.port_check_max_in_flight)
+    return _connect_slots
+
+
+async def check_port(host: str, port: int, timeout: float) -> Tuple[bool, Optional[float]]:
+    """TCP connect to host:port; returns (open, connect latency in ms)"""
+    async with _slots():
+        started = time.perf_counter()
+        try:
+            _reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except (asyncio.TimeoutError, OSError):
+            return False, None
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+        return True, round(latency_ms, 2)
+
+
+async def check_ports(host: str, ports: Iterable, timeout: Optional[float] = None) -> Tuple[Dict[str, bool], Dict[str, Optional[float]]]:
+    """Check all ports of one host concurrently; returns (open by port, latency ms by port)"""
+    if timeout is None:
+        timeout = settings.port_check_timeout
+    status: Dict[str, bool] = {}
+    latency: Dict[str, Optional[float]] = {}
+    keys = []
+    checks = []
+    for port in ports:
+        try:
+            number = int(port)
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= number <= 65535:
+            # Out of range: socket calls raise OverflowError, not OSError
+            status[str(port)], latency[str(port)] = False, None
+            continue
+        keys.append(str(port))
+        checks.append(check_port(host, number, timeout))
+    results = await asyncio.gather(*checks)
+    status.update({key: ok for key, (ok, _latency) in zip(keys, results)})
+    latency.update({key: lat for key, (_ok, lat) in zip(keys, results)})
+    return status, latency
@@ -0,0 +1,200 @@
+import asyncio
+import calendar
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.db_writer import db_writer
+from app.database import ReadSessionLocal
+from app.partitions import drop_expired
+from app.rollups import TIERS, tier_retention_days
+
+
+def _sql_time(dt: datetime) -> str:
+    """DateTime as SQLAlchemy stores it in SQLite, so it compares as text"""
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _epoch(dt: datetime) -> int:
+    return calendar.timegm(dt.timetuple())
+
+
+@dataclass
+class RetentionPolicy:
+    """What expires from one table.
+
+    `expired` is an SQL condition whose last ? is the cutoff (converted by
+    `cutoff`). Tables keyed by an integer `id` are walked in id ranges; other
+    keys ("rowid" or the primary key columns) are deleted in LIMIT batches.
+    `groups` is an SQL query for leading key values to walk one at a time
+    (their ? comes first in `expired`), so each batch reads one key range.
+    """
+    name: str
+    table: str
+    key: str
+    expired: str
+    days: Callable[[], int]
+    cutoff: Callable[[datetime], object] = _sql_time
+    groups: Optional[str] = None
+
+
+POLICIES: List[RetentionPolicy] = [
+    RetentionPolicy("metrics (pre-partitioning)", "metrics", "id", "timestamp < ?", lambda: settings.retention_days),
+    *(
+        RetentionPolicy(f"metric_rollups {res}s", "metric_rollups", "rowid", f"resolution = {res} AND bucket < ?",
+                        lambda res=res: tier_retention_days(res), cutoff=_epoch)
+        for res in TIERS
+    ),
+    RetentionPolicy("metric_archive", "metric_archive", "rowid", "hour < ?", lambda: settings.retention_days,
+                    cutoff=lambda dt: _epoch(dt) - 3600),
+    RetentionPolicy("check_results", "check_results", "check_id, timestamp, server_id", "check_id = ? AND timestamp < ?",
+                    lambda: settings.retention_days, groups="SELECT id FROM checks"),
+    RetentionPolicy("state_intervals", "state_intervals", "rowid", "ended_at < ?", lambda: settings.state_intervals_retention_days),
+    RetentionPolicy("alert_events", "alert_events", "id", "timestamp < ?", lambda: settings.alert_events_retention_days),
+    RetentionPolicy("audit_logs", "audit_logs", "id", "timestamp < ?", lambda: settings.audit_logs_retention_days),
+]
+
+
+class RetentionEngine:
+    """Expires old rows once a day at retention_run_at (UTC).
+
+    Every chunk is its own write job on the writer task, with a pause in
+    between, so ingest never waits behind one huge DELETE. Freed pages are
+    then returned with incremental_vacuum. `status` reports progress and
+    throughput per table (GET /api/retention).
+    """
+
+    def __init__(self, policies: List[RetentionPolicy]):
+        self.policies = policies
+        self.status: Dict = {"state": "idle", "next_run": None, "started_at": None, "finished_at": None,
+                             "duration_s": None, "current": None, "tables": {}, "vacuum": None}
+
+    @staticmethod
+    def next_run(now: datetime) -> datetime:
+        hour, _, minute = settings.retention_run_at.partition(":")
+        run = now.replace(hour=int(hour), minute=int(minute or 0), second=0, microsecond=0)
+        return run if run > now else run + timedelta(days=1)
+
+    async def run_forever(self):
+        while True:
+            now = datetime.utcnow()
+            run = self.next_run(now)
+            self.status["next_run"] = run.isoformat()
+            await asyncio.sleep((run - now).total_seconds())
+            try:
+                await self.run_once()
+            except Exception as exc:
+                self.status["state"] = f"failed: {exc}"
+
+    async def run_once(self):
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        self.status.update(state="running", started_at=now.isoformat(), finished_at=None, duration_s=None, tables={}, vacuum=None)
+
+        # Raw metrics: whole day partitions are dropped, no row deletes needed
+        cutoff = now - timedelta(days=settings.retention_days)
+        self.status["current"] = "metric partitions"
+        dropped = await db_writer.run(lambda db: drop_expired(db, cutoff))
+        self.status["tables"]["metric partitions"] = {"dropped": dropped, "done": True}
+
+        for policy in self.policies:
+            await self._expire(policy, now)
+        await self._vacuum()
+        self.status.update(state="idle", current=None, finished_at=datetime.utcnow().isoformat(),
+                           duration_s=round(time.perf_counter() - started, 1))
+
+    async def _expire(self, policy: RetentionPolicy, now: datetime):
+        progress = {"deleted": 0, "chunks": 0, "seconds": 0.0, "rows_per_second": None, "done": False}
+        self.status["tables"][policy.name] = progress
+        self.status["current"] = policy.name
+        cutoff = policy.cutoff(now - timedelta(days=policy.days()))
+        chunks = self._id_ranges(policy, cutoff) if policy.key == "id" else self._batches(policy, cutoff)
+        started = time.perf_counter()
+        async for deleted in chunks:
+            progress["deleted"] += deleted
+            progress["chunks"] += 1
+            progress["seconds"] = round(time.perf_counter() - started, 2)
+            progress["rows_per_second"] = round(progress["deleted"] / progress["seconds"]) if progress["seconds"] else None
+            await asyncio.sleep(settings.retention_pause_seconds)
+        progress["done"] = True
+
+    async def _id_ranges(self, policy: RetentionPolicy, cutoff) -> AsyncIterator[int]:
+        """Walk [lo, lo + chunk) id ranges from the oldest row until a range holds rows newer than the cutoff"""
+        async with ReadSessionLocal() as db:
+            conn = await db.connection()
+            lo, hi = (await conn.exec_driver_sql(f"SELECT min(id), max(id) FROM {policy.table}")).one()
+        if lo is None:
+            return
+        size = max(settings.retention_chunk_rows, 1)
+        delete_sql = f"DELETE FROM {policy.table} WHERE id >= ? AND id < ? AND {policy.expired}"
+        left_sql = f"SELECT 1 FROM {policy.table} WHERE id >= ? AND id < ? LIMIT 1"
+
+        async def delete_range(db: AsyncSession, lo: int):
+            conn = await db.connection()
+            deleted = (await conn.exec_driver_sql(delete_sql, (lo, lo + size, cutoff))).rowcount
+            left = (await conn.exec_driver_sql(left_sql, (lo, lo + size))).first() is not None
+            return deleted, left
+
+        while lo <= hi:
+            deleted, left = await db_writer.run(lambda db, lo=lo: delete_range(db, lo))
+            yield deleted
+            if left:
+                break  # ids grow with time, everything after this range is newer
+            lo += size
+
+    async def _batches(self, policy: RetentionPolicy, cutoff) -> AsyncIterator[int]:
+        """LIMIT batches in key order, per group when the policy has groups"""
+        groups: List = [None]
+        if policy.groups:
+            async with ReadSessionLocal() as db:
+                groups = (await (await db.connection()).exec_driver_sql(policy.groups)).scalars().all()
+        size = max(settings.retention_chunk_rows, 1)
+        sql = (f"DELETE FROM {policy.table} WHERE ({policy.key}) IN "
+               f"(SELECT {policy.key} FROM {policy.table} WHERE {policy.expired} LIMIT {size})")
+
+        async def delete_batch(db: AsyncSession, params: tuple) -> int:
+            return (await (await db.connection()).exec_driver_sql(sql, params)).rowcount
+
+        for group in groups:
+            params = (cutoff,) if group is None else (group, cutoff)
+            while True:
+                deleted = await db_writer.run(lambda db, params=params: delete_batch(db, params))
+                yield deleted
+                if deleted < size:
+                    break
+
+    async def _vacuum(self):
+        """Return free pages to the filesystem in steps (needs auto_vacuum=INCREMENTAL)"""
+        self.status["current"] = "incremental_vacuum"
+        async with ReadSessionLocal() as db:
+            conn = await db.connection()
+            mode = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+            free = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+        vacuum = {"free_pages": free, "pages_released": 0, "done": False}
+        self.status["vacuum"] = vacuum
+        if mode != 2:
+            vacuum["skipped"] = "auto_vacuum is not INCREMENTAL (run VACUUM once after enabling it)"
+            return
+
+        async def step(db: AsyncSession, pages: int) -> int:
+            conn = await db.connection()
+            # The pragma frees one page per step and returns no rows, so a plain execute stops
+            # after the first page; executescript steps it to the end
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({pages})")
+            return (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+
+        while free:
+            pages = min(free, max(settings.retention_vacuum_pages, 1))
+            remaining = await db_writer.run(lambda db, pages=pages: step(db, pages))
+            if remaining >= free:
+                break
+            vacuum["pages_released"] += free - remaining
+            vacuum["free_pages"] = free = remaining
+            await asyncio.sleep(settings.retention_pause_seconds)
+        vacuum["done"] = True
+
+
+retention_engine = RetentionEngine(POLICIES)
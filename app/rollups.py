@@ -0,0 +1,184 @@
+import asyncio
+import calendar
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.db_writer import db_writer
+from app.models import ROLLUP_AGGREGATES, ROLLUP_METRICS, metric_rollups
+
+
+# Tier resolutions in seconds, finest first. Ingest feeds the first tier;
+# every coarser tier is folded from the one before it.
+TIERS: Tuple[int, ...] = (60, 300, 3600)
+
+
+def tier_retention_days(resolution: int) -> int:
+    return {
+        60: settings.rollup_1m_retention_days,
+        300: settings.rollup_5m_retention_days,
+        3600: settings.rollup_1h_retention_days,
+    }[resolution]
+
+
+ROLLUP_COLUMNS: Tuple[str, ...] = ("server_id", "resolution", "bucket", "samples", "last_ts") + tuple(
+    f"{name}_{agg}" for name in ROLLUP_METRICS for agg in ROLLUP_AGGREGATES
+)
+
+
+def _merge(name: str) -> List[str]:
+    t = metric_rollups.name
+    return [
+        # SQLite's scalar min()/max() return NULL if any argument is NULL
+        f"{name}_min = min(coalesce({t}.{name}_min, excluded.{name}_min), coalesce(excluded.{name}_min, {t}.{name}_min))",
+        f"{name}_max = max(coalesce({t}.{name}_max, excluded.{name}_max), coalesce(excluded.{name}_max, {t}.{name}_max))",
+        f"{name}_sum = {t}.{name}_sum + excluded.{name}_sum",
+        f"{name}_count = {t}.{name}_count + excluded.{name}_count",
+        f"{name}_last = CASE WHEN excluded.last_ts >= {t}.last_ts THEN excluded.{name}_last ELSE {t}.{name}_last END",
+    ]
+
+
+# Folds one sample into its 1-minute bucket; executemany applies a batch's samples one after another.
+# Used by app.ingest.insert_metrics in the same transaction as the raw insert.
+ROLLUP_UPSERT = (
+    " ON CONFLICT (server_id, resolution, bucket) DO UPDATE SET "
+    f"samples = {metric_rollups.name}.samples + excluded.samples, "
+    f"last_ts = max({metric_rollups.name}.last_ts, excluded.last_ts), "
+    + ", ".join(clause for name in ROLLUP_METRICS for clause in _merge(name))
+)
+
+
+def _epoch(ts: datetime) -> float:
+    """Naive UTC datetime -> unix seconds"""
+    return calendar.timegm(ts.timetuple()) + ts.microsecond / 1e6
+
+
+def rollup_rows(metric_rows: Iterable[tuple], positions: Dict[str, int]) -> List[tuple]:
+    """One finest-tier rollup row per metric row; positions maps column name -> index in the metric row"""
+    rows: List[tuple] = []
+    resolution = TIERS[0]
+    ts_pos = positions["timestamp"]
+    value_pos = [positions[name] for name in ROLLUP_METRICS]
+    for row in metric_rows:
+        ts = _epoch(row[ts_pos])
+        values = []
+        for pos in value_pos:
+            v = row[pos]
+            if v is None:
+                values.extend((None, None, 0.0, 0, None))
+            else:
+                v = float(v)
+                values.extend((v, v, v, 1, v))
+        rows.append((row[positions["server_id"]], resolution, int(ts) // resolution * resolution, 1, ts, *values))
+    return rows
+
+
+def _fold_sql(resolution: int, child: int) -> str:
+    """Rebuild `resolution` buckets from their `child` buckets. Idempotent, so a bucket can be
+    refolded as often as needed while it is still filling up."""
+    t = metric_rollups.name
+    aggregates = []
+    for name in ROLLUP_METRICS:
+        aggregates += [
+            f"min({name}_min)", f"max({name}_max)", f"sum({name}_sum)", f"sum({name}_count)",
+            f"max(CASE WHEN newest = 1 THEN {name}_last END)",
+        ]
+    return (
+        f"INSERT OR REPLACE INTO {t} ({', '.join(ROLLUP_COLUMNS)}) "
+        f"WITH src AS (SELECT *, bucket / {resolution} * {resolution} AS parent, "
+        f"row_number() OVER (PARTITION BY server_id, bucket / {resolution} ORDER BY last_ts DESC) AS newest "
+        f"FROM {t} WHERE resolution = {child} AND bucket >= ?) "
+        f"SELECT server_id, {resolution}, parent, sum(samples), max(last_ts), {', '.join(aggregates)} "
+        f"FROM src GROUP BY server_id, parent"
+    )
+
+
+_FOLDS = [(resolution, child, _fold_sql(resolution, child)) for child, resolution in zip(TIERS, TIERS[1:])]
+_last_fold: Optional[float] = None
+
+
+async def _fold(conn, since: float):
+    for resolution, _child, sql in _FOLDS:
+        await conn.exec_driver_sql(sql, (int(since) // resolution * resolution,))
+
+
+async def fold_rollups(db: AsyncSession):
+    """Refresh the coarser tiers for buckets touched since the previous fold. Does not commit."""
+    global _last_fold
+    now = time.time()
+    # First fold after a start catches up on the last couple of hours
+    since = (_last_fold if _last_fold is not None else now - 2 * TIERS[-1]) - settings.rollup_fold_seconds
+    await _fold(await db.connection(), since)
+    _last_fold = now
+
+
+async def backfill_rollups(conn) -> None:
+    """Build an empty rollup table from raw history (one-off, at startup)"""
+    if (await conn.exec_driver_sql(f"SELECT 1 FROM {metric_rollups.name} LIMIT 1")).first():
+        return
+    resolution = TIERS[0]
+    since = time.time() - tier_retention_days(resolution) * 86400
+    aggregates = []
+    for name in ROLLUP_METRICS:
+        aggregates += [f"min({name})", f"max({name})", f"coalesce(sum({name}), 0)", f"count({name})",
+                       f"max(CASE WHEN newest = 1 THEN {name} END)"]
+    await conn.exec_driver_sql(
+        f"INSERT OR REPLACE INTO {metric_rollups.name} ({', '.join(ROLLUP_COLUMNS)}) "
+        f"WITH raw AS (SELECT *, (julianday(timestamp) - 2440587.5) * 86400.0 AS ts FROM metrics WHERE timestamp >= ?), "
+        f"src AS (SELECT *, CAST(ts AS INTEGER) / {resolution} AS b, "
+        f"row_number() OVER (PARTITION BY server_id, CAST(ts AS INTEGER) / {resolution} ORDER BY ts DESC) AS newest FROM raw) "
+        f"SELECT server_id, {resolution}, b * {resolution}, count(*), max(ts), "
+        f"{', '.join(aggregates)} FROM src GROUP BY server_id, b",
+        (datetime.utcfromtimestamp(since).isoformat(" "),),
+    )
+    await _fold(conn, since)
+
+
+async def rollup_loop():
+    """Fold the coarser tiers through the writer task every rollup_fold_seconds"""
+    while True:
+        await asyncio.sleep(settings.rollup_fold_seconds)
+        try:
+            await db_writer.run(fold_rollups)
+        except Exception:
+            pass
+
+
+def choose_resolution(window_seconds: float, max_points: int, raw_interval: float) -> int:
+    """Finest source whose retention covers the window and whose point count fits max_points.
+
+    0 means raw metrics. Falls back to the coarsest tier when nothing fits.
+    """
+    candidates = [(0, raw_interval, settings.retention_days)] + [(r, r, tier_retention_days(r)) for r in TIERS]
+    for resolution, step, retention_days in candidates:
+        if window_seconds <= retention_days * 86400 and window_seconds / max(step, 1) <= max_points:
+            return resolution
+    return TIERS[-1]
+
+
+async def get_rollup_history(db: AsyncSession, server_id: int, since: datetime, resolution: int) -> List[Dict]:
+    """Rollup points in the history API shape: averages under the metric names, plus _min/_max"""
+    c = metric_rollups.c
+    rows = (await db.execute(
+        select(metric_rollups)
+        .where(and_(c.server_id == server_id, c.resolution == resolution, c.bucket >= int(_epoch(since)) // resolution * resolution))
+        .order_by(c.bucket.asc())
+    )).mappings().all()
+
+    points = []
+    for row in rows:
+        point: Dict = {"timestamp": datetime.utcfromtimestamp(row["bucket"]).isoformat(), "resolution": resolution, "samples": row["samples"]}
+        for name in ROLLUP_METRICS:
+            count = row[f"{name}_count"]
+            point[name] = row[f"{name}_sum"] / count if count else None
+            point[f"{name}_min"] = row[f"{name}_min"]
+            point[f"{name}_max"] = row[f"{name}_max"]
+        # reachable keeps its raw meaning (last state); the average becomes availability
+        point["availability"] = point["reachable"]
+        point["reachable"] = bool(row["reachable_last"]) if row["reachable_last"] is not None else None
+        point["network_io"] = round(((point["network_in_kbps"] or 0) + (point["network_out_kbps"] or 0)) / 1024, 2)
+        point["services_status"] = point["ports_status"] = point["ports_latency"] = point["probe_status"] = None
+        points.append(point)
+    return points
@@ -1,11 +1,11 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
 from fastapi.responses import RedirectResponse, JSONResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from starlette.status import HTTP_302_FOUND
-from app.database import get_db
-from app.models import User, Server, Metric, UserRole, AuditLog
+from app.database import get_db, get_read_db
+from app.models import User, Server, MetricLatest, UserRole, AuditLog
 from app.models import AlertRule, AlertEvent, AlertGroup
 from app.schemas import ServerCreate, ServerUpdate
 from app.security import verify_password, hash_password
@@ -13,11 +13,23 @@ from app.ldap_utils import ldap_authenticate
 from app.config import settings
 from app.encryption import encrypt_password
 from app.services import MonitoringService
+from app.fleet_state import fleet_state, server_dict
+from app.checks import get_check_failures, list_checks
+from app.server_list import server_page
+from app.transitions import get_uptime, uptime_by_environment
+from app.retention import retention_engine
+from app.broadcaster import broadcaster
+from app.downsample import downsample_points, to_columns
+from app.ssh_pool import ssh_pool
+from app import ssh_collector
+from app.snmp_poller import snmp_poller
 from app.time_utils import format_moscow_time, format_moscow_time_short
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+import json
 import time
+from urllib.parse import urlencode
 
 
 router = APIRouter()
@@ -51,7 +63,7 @@ def check_login_rate_limit(ip_address: str) -> bool:
 
 
 @router.get("/")
-async def index(request: Request, db: AsyncSession = Depends(get_db)):
+async def index(request: Request, db: AsyncSession = Depends(get_read_db)):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
     servers = (await db.execute(select(Server))).scalars().all()
@@ -59,7 +71,7 @@ async def index(request: Request, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/statistics")
-async def statistics_page(request: Request, db: AsyncSession = Depends(get_db)):
+async def statistics_page(request: Request, db: AsyncSession = Depends(get_read_db)):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
     return request.app.state.templates.TemplateResponse("statistics.html", {"request": request})
@@ -140,77 +152,33 @@ async def logout(request: Request):
 @router.get("/servers")
 async def list_servers(
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     q: str | None = None,
     cluster: str | None = None,  # 'yes' | 'no' | None
     reachable: str | None = None,  # 'yes' | 'no' | None
     environment: str | None = None,  # 'test' | 'stage' | 'prod' | None
-    sort: str | None = None,  # hostname|ip|reachable|cpu|ram
+    sort: str | None = None,  # hostname|ip|reachable|cpu|ram|system|environment, '-' reverses
     tag: str | None = None,
     system: str | None = None,  # system name filter
     owner: str | None = None,  # owner filter
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    after: str | None = None,  # cursor of the previous page's last row
+    before: str | None = None,  # cursor of the next page's first row
 ):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
-    servers = (await db.execute(select(Server))).scalars().all()
-
-    # Attach latest metric snapshot per server
-    enriched = []
-    for s in servers:
-        latest = (await db.execute(
-            select(Metric).where(Metric.server_id == s.id).order_by(Metric.timestamp.desc()).limit(1)
-        )).scalar_one_or_none()
-        enriched.append((s, latest))
-
-    # Filters
-    if q:
-        qlow = q.lower()
-        enriched = [e for e in enriched if (qlow in e[0].hostname.lower()) or (qlow in e[0].ip_address.lower()) or (e[0].system_name and qlow in e[0].system_name.lower()) or (e[0].owner and qlow in e[0].owner.lower())]
-    if cluster in {"yes", "no"}:
-        want = cluster == "yes"
-        enriched = [e for e in enriched if bool(e[0].is_cluster) == want]
-    if reachable in {"yes", "no"}:
-        want = reachable == "yes"
-        enriched = [e for e in enriched if (e[1].reachable if e[1] is not None else False) == want]
-    if environment in {"test", "stage", "prod"}:
-        enriched = [e for e in enriched if e[0].environment == environment]
-    if tag:
-        t = tag.lower()
-        enriched = [e for e in enriched if (e[0].tags and t in e[0].tags.lower())]
-    if system:
-        enriched = [e for e in enriched if e[0].system_name == system]
-    if owner:
-        enriched = [e for e in enriched if e[0].owner and owner.lower() in e[0].owner.lower()]
-
-    # Sorting
-    key_func = None
-    reverse = False
-    if sort == "hostname":
-        key_func = lambda e: e[0].hostname.lower()
-    elif sort == "ip":
-        key_func = lambda e: e[0].ip_address
-    elif sort == "reachable":
-        key_func = lambda e: (e[1].reachable if e[1] is not None else False)
-        reverse = True
-    elif sort == "cpu":
-        key_func = lambda e: (e[1].cpu_percent if (e[1] and e[1].cpu_percent is not None) else -1)
-        reverse = True
-    elif sort == "ram":
-        key_func = lambda e: (e[1].ram_percent if (e[1] and e[1].ram_percent is not None) else -1)
-        reverse = True
-    elif sort == "system":
-        key_func = lambda e: (e[0].system_name or "").lower()
-    if key_func:
-        enriched.sort(key=key_func, reverse=reverse)
+    # The page is chosen in SQL (filters, sort, keyset cursor); rows render from the fleet state
+    await fleet_state.ensure_loaded(db)
+    result = await server_page(
+        db, q=q, cluster=cluster, reachable=reachable, environment=environment, tag=tag, system=system,
+        owner=owner, sort=sort, per_page=per_page, page=page, after=after, before=before,
+    )
+    records = [r for r in (fleet_state.record(server_id) for server_id in result.ids) if r is not None]
 
     # Pagination
-    total_items = len(enriched)
+    total_items = result.total
     total_pages = (total_items + per_page - 1) // per_page
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    paginated_enriched = enriched[start_idx:end_idx]
 
     # Create pagination object
     class Pagination:
@@ -223,6 +191,9 @@ async def list_servers(
             self.has_next = page < total_pages
             self.prev_num = page - 1 if self.has_prev else None
             self.next_num = page + 1 if self.has_next else None
+            # Next/previous links continue from the page edges instead of counting rows
+            self.next_cursor = result.next_cursor
+            self.prev_cursor = result.prev_cursor
             
         def iter_pages(self, left_edge=2, right_edge=2, left_current=2, right_current=3):
             last = self.pages
@@ -232,15 +203,17 @@ async def list_servers(
                    num > last - right_edge:
                     yield num
 
-    pagination = Pagination(page, per_page, total_items, paginated_enriched)
+    pagination = Pagination(page, per_page, total_items, records)
+    query = urlencode([(k, v) for k, v in request.query_params.multi_items() if k not in {"page", "after", "before"}])
 
     is_admin = (request.session.get("role") == UserRole.admin.value) if hasattr(request, "session") else False
     return request.app.state.templates.TemplateResponse(
         "servers.html",
         {
             "request": request,
-            "servers": [e[0] for e in paginated_enriched],
-            "latest_map": {e[0].id: e[1] for e in paginated_enriched},
+            "servers": records,
+            "latest_map": {r.id: r.latest for r in records},
+            "query": query,
             "params": {"q": q or "", "cluster": cluster or "", "reachable": reachable or "", "environment": environment or "", "sort": sort or "", "tag": tag or "", "system": system or "", "owner": owner or ""},
             "is_admin": is_admin,
             "pagination": pagination,
@@ -273,6 +246,7 @@ async def create_server(request: Request, db: AsyncSession = Depends(get_db), ho
     server = Server(hostname=hostname, ip_address=ip_address, system_name=system_name, owner=owner, is_cluster=is_cluster, environment=environment, tags=tags, ssh_host=ssh_host, ssh_port=ssh_port, ssh_username=ssh_username, ssh_password=encrypted_ssh_password, snmp_version=snmp_version, snmp_community=encrypted_snmp_community, services_to_monitor=clean_string(services_to_monitor), ports_to_monitor=clean_string(ports_to_monitor))
     db.add(server)
     await db.commit()
+    fleet_state.upsert_server(server)
     db.add(AuditLog(username=request.session.get("username"), action="server_create", details=f"{hostname} {ip_address}"))
     await db.commit()
     return RedirectResponse(url="/servers", status_code=HTTP_302_FOUND)
@@ -285,14 +259,19 @@ async def delete_server(request: Request, server_id: int, db: AsyncSession = Dep
     if request.session.get("role") not in {UserRole.admin.value, UserRole.operator.value}:
         raise HTTPException(status_code=403, detail="Admins only")
     await db.execute(delete(Server).where(Server.id == server_id))
+    await db.execute(delete(MetricLatest).where(MetricLatest.server_id == server_id))
     await db.commit()
+    fleet_state.remove_server(server_id)
+    ssh_pool.invalidate(server_id)
+    ssh_collector.forget(server_id)
+    snmp_poller.forget(server_id)
     db.add(AuditLog(username=request.session.get("username"), action="server_delete", details=str(server_id)))
     await db.commit()
     return RedirectResponse(url="/servers", status_code=HTTP_302_FOUND)
 
 
 @router.get("/servers/export.csv")
-async def export_servers_csv(db: AsyncSession = Depends(get_db)):
+async def export_servers_csv(db: AsyncSession = Depends(get_read_db)):
     servers = (await db.execute(select(Server))).scalars().all()
     def gen():
         yield "hostname,ip_address,system_name,owner,is_cluster,tags\n".encode("utf-8")
@@ -310,7 +289,7 @@ async def export_servers_csv(db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/servers/{server_id}")
-async def server_detail(request: Request, server_id: int, db: AsyncSession = Depends(get_db)):
+async def server_detail(request: Request, server_id: int, db: AsyncSession = Depends(get_read_db)):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
     server = (await db.execute(select(Server).where(Server.id == server_id))).scalar_one_or_none()
@@ -320,7 +299,7 @@ async def server_detail(request: Request, server_id: int, db: AsyncSession = Dep
 
 
 @router.get("/servers/{server_id}/edit")
-async def edit_server_page(request: Request, server_id: int, db: AsyncSession = Depends(get_db)):
+async def edit_server_page(request: Request, server_id: int, db: AsyncSession = Depends(get_read_db)):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
     if request.session.get("role") not in {UserRole.admin.value, UserRole.operator.value}:
@@ -336,7 +315,8 @@ async def edit_server(request: Request, server_id: int, db: AsyncSession = Depen
                       hostname: str = Form(...), ip_address: str = Form(...), system_name: str = Form(""),
                       owner: str = Form(""), is_cluster: bool = Form(False), environment: str = Form("prod"), tags: str = Form(""),
                       ssh_host: str = Form(""), ssh_port: int = Form(22), ssh_username: str = Form(""), ssh_password: str = Form(""),
-                      snmp_version: str = Form(""), snmp_community: str = Form(""), services_to_monitor: str = Form(""), ports_to_monitor: str = Form(""), metric_source: str = Form("auto")):
+                      snmp_version: str = Form(""), snmp_community: str = Form(""), services_to_monitor: str = Form(""), ports_to_monitor: str = Form(""), metric_source: str = Form("auto"),
+                      monitor_interval: str = Form("")):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
     if request.session.get("role") not in {UserRole.admin.value, UserRole.operator.value}:
@@ -369,7 +349,17 @@ async def edit_server(request: Request, server_id: int, db: AsyncSession = Depen
     if snmp_community and snmp_community.strip():
         server.snmp_community = encrypt_password(snmp_community)
     server.metric_source = metric_source
+    # Empty or invalid interval falls back to the global default
+    try:
+        server.monitor_interval = max(5, int(monitor_interval)) if monitor_interval and monitor_interval.strip() else None
+    except ValueError:
+        server.monitor_interval = None
     await db.commit()
+    fleet_state.upsert_server(server)
+    # Pooled SSH connections are also re-keyed by ssh_* fields, this just frees the old one early
+    ssh_pool.invalidate(server_id)
+    ssh_collector.forget(server_id)
+    snmp_poller.forget(server_id)
     db.add(AuditLog(username=request.session.get("username"), action="server_update", details=str(server_id)))
     await db.commit()
     return RedirectResponse(url=f"/servers/{server_id}", status_code=HTTP_302_FOUND)
@@ -377,23 +367,165 @@ async def edit_server(request: Request, server_id: int, db: AsyncSession = Depen
 
 # ---- API for metrics ----
 
+# Polled views carry weak ETags from the fleet state; browsers revalidate every
+# poll and get a bodiless 304 until the next monitor result is stored
+CACHE_CONTROL = "private, no-cache"
+
+
+def not_modified(request: Request, etag: str | None) -> Response | None:
+    """304 response when If-None-Match already names the current version (weak comparison)"""
+    header = request.headers.get("if-none-match")
+    if not header or etag is None:
+        return None
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
 @router.get("/api/servers")
-async def api_servers(db: AsyncSession = Depends(get_db)):
-    """Get all servers with latest metrics using optimized service"""
-    servers_data = await MonitoringService.get_servers_with_latest_metrics(db)
-    return JSONResponse(servers_data)
+async def api_servers(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """All servers with latest metrics, from the in-memory fleet state"""
+    await fleet_state.ensure_loaded(db)
+    etag = fleet_state.etag("servers")
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    # Serialized once per fleet state version
+    body = fleet_state.view("api_servers", lambda: JSONResponse([server_dict(r) for r in fleet_state.records()]).body)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
 
 
 @router.get("/api/metrics/{server_id}")
-async def api_metrics(server_id: int, db: AsyncSession = Depends(get_db), minutes: int = Query(120, ge=1, le=1440)):
-    """Get metrics history for a server using optimized service"""
-    hours = minutes // 60
-    metrics_data = await MonitoringService.get_server_metrics_history(db, server_id, hours)
-    return JSONResponse(metrics_data)
+async def api_metrics(server_id: int, request: Request, db: AsyncSession = Depends(get_read_db), minutes: int = Query(120, ge=1, le=525600),
+                      max_points: int = Query(500, ge=10, le=10000),
+                      fmt: str = Query("rows", alias="format", pattern="^(rows|columns)$"),
+                      fields: str | None = None,
+                      downsample: str = Query("lttb", pattern="^(lttb|minmax|none)$"),
+                      since: datetime | None = None):
+    """Metrics history for a server; long windows come from the 1m/5m/1h rollup tiers.
+
+    More than max_points samples are downsampled (LTTB or min/max per bucket) over
+    `fields` (comma separated, default all numeric fields). format=columns returns
+    one array per field plus `timestamp` in unix milliseconds.
+
+    `since` takes the cursor of a previous response (X-Metrics-Cursor, or `cursor`
+    in the columnar body) and returns only what is new after it. Points at or
+    after the first returned timestamp replace the caller's copies (rollup
+    buckets are re-sent while they fill up).
+    """
+    await fleet_state.ensure_loaded(db)
+    etag = fleet_state.metrics_etag(server_id)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    resolution, metrics_data = await MonitoringService.get_server_metrics(db, server_id, minutes, max_points, since)
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    metrics_data = downsample_points(metrics_data, names, max_points, downsample)
+    cursor = metrics_data[-1]["timestamp"] if metrics_data else (since.isoformat() if since else "")
+    headers = {"X-Metrics-Resolution": str(resolution), "X-Metrics-Cursor": cursor, "Cache-Control": CACHE_CONTROL}
+    if etag is not None:
+        headers["ETag"] = etag
+    if fmt == "columns":
+        body = to_columns(metrics_data, names, resolution)
+        body["cursor"] = cursor or None
+        return JSONResponse(body, headers=headers)
+    return JSONResponse(metrics_data, headers=headers)
+
+
+@router.get("/api/checks")
+async def api_checks(db: AsyncSession = Depends(get_read_db)):
+    """Check dictionary: every service and port name seen in probe results"""
+    return JSONResponse(await list_checks(db))
+
+
+@router.get("/api/checks/failures")
+async def api_check_failures(db: AsyncSession = Depends(get_read_db), minutes: int = Query(60, ge=1, le=525600),
+                             kind: str | None = Query(None, pattern="^(service|port)$"), name: str | None = None):
+    """Failed service/port checks across the fleet, per check and server (e.g. ?kind=port&name=443)"""
+    since = datetime.utcnow() - timedelta(minutes=minutes)
+    return JSONResponse(await get_check_failures(db, since, kind, name))
+
+
+@router.get("/api/uptime")
+async def api_uptime(db: AsyncSession = Depends(get_read_db), minutes: int = Query(1440, ge=1, le=525600),
+                     by: str = Query("server", pattern="^(server|environment)$"),
+                     kind: str = Query("host", pattern="^(host|service|port)$"), name: str | None = None,
+                     server_id: int | None = None, environment: str | None = None):
+    """Availability over the last `minutes` from the state transition log, per server or environment"""
+    until = datetime.utcnow()
+    since = until - timedelta(minutes=minutes)
+    per_server = await get_uptime(db, since, until, kind, name, server_id, environment)
+    if by == "environment":
+        return JSONResponse(uptime_by_environment(per_server, minutes * 60.0))
+    return JSONResponse(per_server)
+
+
+@router.get("/api/monitor/schedule")
+async def api_monitor_schedule(request: Request):
+    """Per-server schedule: interval, phase, last dispatch lag and next due time"""
+    scheduler = getattr(request.app.state, "scheduler", None)
+    return JSONResponse(scheduler.snapshot() if scheduler else [])
+
+
+@router.get("/api/monitor/budget")
+async def api_monitor_budget(request: Request):
+    """Probe time used vs. max_concurrency * interval, per interval window"""
+    scheduler = getattr(request.app.state, "scheduler", None)
+    return JSONResponse(scheduler.budget() if scheduler else {"current": None, "history": []})
+
+
+@router.get("/api/retention")
+async def api_retention():
+    """Retention engine progress: rows deleted, chunks and rows/s per table, vacuum state, next run"""
+    return JSONResponse(retention_engine.status)
+
+
+@router.get("/api/stream")
+async def api_stream(request: Request, servers: str | None = None, db: AsyncSession = Depends(get_read_db)):
+    """Server-sent events with /api/servers entries as new results arrive.
+
+    `servers` (comma separated ids) limits the stream to those servers, default
+    the whole fleet. The first event is the current state of every subscribed
+    server; later events carry only servers with new results.
+    """
+    if not request.user.is_authenticated:
+        raise HTTPException(status_code=401, detail="Login required")
+    await fleet_state.ensure_loaded(db)
+    server_ids = {int(s) for s in servers.split(",") if s.strip().isdigit()} if servers else None
+    subscriber = broadcaster.subscribe(server_ids)
+    if subscriber is None:
+        return JSONResponse({"detail": "Too many live subscribers"}, status_code=503, headers={"Retry-After": "30"})
+    subscriber.offer({r.id: server_dict(r) for r in fleet_state.records()})
+
+    async def events():
+        try:
+            yield f"retry: {settings.push_heartbeat_seconds * 1000}\n\n"
+            while True:
+                entries = await subscriber.next(settings.push_heartbeat_seconds)
+                if entries is None:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: servers\ndata: {json.dumps(entries)}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/api/stream/stats")
+async def api_stream_stats(request: Request):
+    """Live update subscribers and how many updates slow clients had merged"""
+    if not request.user.is_authenticated:
+        raise HTTPException(status_code=401, detail="Login required")
+    return JSONResponse(broadcaster.stats())
 
 
 @router.get("/users")
-async def users_page(request: Request, db: AsyncSession = Depends(get_db)):
+async def users_page(request: Request, db: AsyncSession = Depends(get_read_db)):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
     if request.session.get("role") not in {UserRole.admin.value}:
@@ -403,7 +535,7 @@ async def users_page(request: Request, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/audit")
-async def audit_page(request: Request, db: AsyncSession = Depends(get_db)):
+async def audit_page(request: Request, db: AsyncSession = Depends(get_read_db)):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
     if request.session.get("role") not in {UserRole.admin.value}:
@@ -435,8 +567,18 @@ async def create_user(request: Request, db: AsyncSession = Depends(get_db), user
 # ---- Prometheus exporter ----
 
 @router.get("/metrics")
-async def prometheus_metrics(db: AsyncSession = Depends(get_db)):
-    servers = (await db.execute(select(Server))).scalars().all()
+async def prometheus_metrics(request: Request, db: AsyncSession = Depends(get_read_db)):
+    # Rendered from the in-memory fleet state; re-rendered only when it changes
+    await fleet_state.ensure_loaded(db)
+    etag = fleet_state.etag("prometheus")
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    body = fleet_state.view("prometheus", lambda: _render_prometheus(fleet_state.records()))
+    return Response(content=body, media_type="text/plain; version=0.0.4", headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def _render_prometheus(servers) -> str:
     lines = []
     lines.append("# HELP server_reachable Server reachability by ping (1 reachable, 0 unreachable)")
     lines.append("# TYPE server_reachable gauge")
@@ -462,7 +604,7 @@ async def prometheus_metrics(db: AsyncSession = Depends(get_db)):
     lines.append("# TYPE server_disk_io_write gauge")
 
     for s in servers:
-        latest = (await db.execute(select(Metric).where(Metric.server_id == s.id).order_by(Metric.timestamp.desc()).limit(1))).scalar_one_or_none()
+        latest = s.latest
         def esc(v: str) -> str:
             return v.replace('\\', '\\\\').replace('"', '\\"')
         labels = f'server_id="{s.id}",hostname="{esc(s.hostname)}",ip="{esc(s.ip_address)}"'
@@ -491,12 +633,11 @@ async def prometheus_metrics(db: AsyncSession = Depends(get_db)):
         if latest.disk_io_write is not None:
             lines.append(f"server_disk_io_write{{{labels}}} {latest.disk_io_write}")
 
-    body = "\n".join(lines) + "\n"
-    return Response(content=body, media_type="text/plain; version=0.0.4")
+    return "\n".join(lines) + "\n"
 
 
 @router.get("/profile")
-async def profile_page(request: Request, db: AsyncSession = Depends(get_db)):
+async def profile_page(request: Request, db: AsyncSession = Depends(get_read_db)):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
     username = request.session.get("username")
@@ -562,7 +703,7 @@ async def change_user_role(request: Request, user_id: int, role: str = Form(...)
 # ---- Alerts UI ----
 
 @router.get("/alerts")
-async def alerts_page(request: Request, db: AsyncSession = Depends(get_db)):
+async def alerts_page(request: Request, db: AsyncSession = Depends(get_read_db)):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
     if request.session.get("role") not in {UserRole.admin.value, UserRole.operator.value}:
@@ -614,6 +755,7 @@ async def import_servers_csv(request: Request, db: AsyncSession = Depends(get_db
     content = await file.read()
     text = content.decode("utf-8", errors="ignore")
     reader = csv.DictReader(io.StringIO(text))
+    imported = []
     for row in reader:
         hostname = (row.get('hostname') or '').strip()
         ip = (row.get('ip_address') or '').strip()
@@ -625,7 +767,10 @@ async def import_servers_csv(request: Request, db: AsyncSession = Depends(get_db
         tags = (row.get('tags') or '').strip() or None
         server = Server(hostname=hostname, ip_address=ip, system_name=system_name, owner=owner, is_cluster=is_cluster, tags=tags)
         db.add(server)
+        imported.append(server)
     await db.commit()
+    for server in imported:
+        fleet_state.upsert_server(server)
     return RedirectResponse(url="/servers", status_code=HTTP_302_FOUND)
 
 
@@ -705,7 +850,7 @@ async def set_user_password(request: Request, user_id: int, new_password: str =
 # ---- Alert Groups Management ----
 
 @router.get("/alert-groups")
-async def alert_groups_page(request: Request, db: AsyncSession = Depends(get_db)):
+async def alert_groups_page(request: Request, db: AsyncSession = Depends(get_read_db)):
     if not request.user.is_authenticated:
         return RedirectResponse(url="/login", status_code=HTTP_302_FOUND)
     if request.session.get("role") not in {UserRole.admin.value, UserRole.operator.value}:
@@ -748,7 +893,7 @@ async def delete_alert_group(request: Request, group_id: int, db: AsyncSession =
 # ---- PDF Export ----
 
 @router.get("/reports/export.pdf")
-async def export_report_pdf(request: Request, db: AsyncSession = Depends(get_db), 
+async def export_report_pdf(request: Request, db: AsyncSession = Depends(get_read_db), 
                           report_type: str = Query("servers", regex="^(servers|alerts|metrics)$"),
                           server_id: int = Query(None)):
     if not request.user.is_authenticated:
@@ -785,12 +930,10 @@ async def export_report_pdf(request: Request, db: AsyncSession = Depends(get_db)
             # Create table data
             data = [['Hostname', 'IP Address', 'System', 'Owner', 'Environment', 'Status']]
             
+            latest_by_server = await MonitoringService.get_latest_metrics_map(db)
             for server in servers:
                 # Get latest metric
-                latest_metric = (await db.execute(
-                    select(Metric).where(Metric.server_id == server.id)
-                    .order_by(Metric.timestamp.desc()).limit(1)
-                )).scalar_one_or_none()
+                latest_metric = latest_by_server.get(server.id)
                 
                 status = "Unknown"
                 if latest_metric:
@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import math
+import random
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from app.config import settings
+from app.models import Server
+from app.fleet_state import fleet_state
+
+
+# Golden-ratio spread gives well separated phase offsets for consecutive ids
+_PHASE_SPREAD = 0.6180339887498949
+
+
+class MonitorScheduler:
+    """Per-server probe scheduler replacing the lockstep monitor loop.
+
+    Every server gets its own interval (Server.monitor_interval or the
+    global default), a fixed phase offset within that interval and a random
+    jitter per slot. Slots are kept on a heap and dispatched as they come
+    due; results are handed to the database writer task as they arrive,
+    which stores them in small batches. Slots are fixed-rate, so a slow probe does not push the next
+    one back; a server whose previous probe is still running skips the slot.
+    """
+
+    def __init__(self, db_factory, probe, store, evaluate=None):
+        self.db_factory = db_factory
+        self._probe = probe  # async (server, semaphore) -> result dict
+        self._store = store  # ([result]) -> None, queues results for writing
+        self._evaluate = evaluate  # async (db) -> None, run once per default interval
+        self._heap: List[Tuple[float, int, int, int, float]] = []  # (due, seq, server_id, generation, base)
+        self._seq = 0
+        self._servers: Dict[int, Server] = {}
+        self._generation: Dict[int, int] = {}
+        self._running: Dict[int, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._sem = asyncio.Semaphore(settings.max_concurrency)
+        # Per-server schedule state, exposed through /api/monitor/schedule
+        self.state: Dict[int, Dict] = {}
+        # Budget accounting per window of one default interval, exposed through /api/monitor/budget
+        self._window = self._new_window()
+        self.budget_history: deque = deque(maxlen=60)
+
+    def _new_window(self) -> Dict:
+        return {"started": time.monotonic(), "started_at": time.time(), "probes": 0, "ok": 0,
+                "timeout": 0, "error": 0, "busy_seconds": 0.0, "durations": [], "peak_running": 0}
+
+    def _close_window(self, now: float) -> Dict:
+        window = self._window
+        seconds = max(now - window["started"], 1e-9)
+        budget = settings.max_concurrency * seconds
+        durations = sorted(window["durations"])
+        p95 = durations[int(0.95 * (len(durations) - 1))] if durations else None
+        return {
+            "started_at": window["started_at"],
+            "window_seconds": round(seconds, 3),
+            "probes": window["probes"],
+            "ok": window["ok"],
+            "timeout": window["timeout"],
+            "error": window["error"],
+            "busy_seconds": round(window["busy_seconds"], 3),
+            "budget_seconds": round(budget, 3),
+            # Share of max_concurrency * window spent inside probes
+            "utilization": round(window["busy_seconds"] / budget, 4),
+            # Average number of probe slots actually needed over the window
+            "needed_concurrency": round(window["busy_seconds"] / seconds, 2),
+            "p95_duration_seconds": round(p95, 3) if p95 is not None else None,
+            "peak_running": window["peak_running"],
+            "max_concurrency": settings.max_concurrency,
+        }
+
+    def _record(self, result: Dict):
+        now = time.monotonic()
+        if now - self._window["started"] >= settings.monitor_interval_seconds:
+            self.budget_history.append(self._close_window(now))
+            self._window = self._new_window()
+        window = self._window
+        window["probes"] += 1
+        status = result.get("probe_status") or "ok"
+        window[status if status in ("ok", "timeout", "error") else "error"] += 1
+        duration = (result.get("probe_duration_ms") or 0.0) / 1000.0
+        window["busy_seconds"] += duration
+        window["durations"].append(duration)
+
+    def budget(self) -> Dict:
+        return {"current": self._close_window(time.monotonic()), "history": list(self.budget_history)}
+
+    def interval_for(self, server: Server) -> float:
+        return float(server.monitor_interval or settings.monitor_interval_seconds)
+
+    def _jitter(self, interval: float) -> float:
+        spread = interval * settings.monitor_jitter_fraction
+        return random.uniform(-spread, spread) if spread > 0 else 0.0
+
+    def _push(self, server_id: int, base: float):
+        interval = self.interval_for(self._servers[server_id])
+        due = base + self._jitter(interval)
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, server_id, self._generation[server_id], base))
+        self.state.setdefault(server_id, {})["next_due"] = time.time() + (due - time.monotonic())
+        self._wakeup.set()
+
+    def _schedule_new(self, server: Server):
+        interval = self.interval_for(server)
+        self._generation[server.id] = self._generation.get(server.id, 0) + 1
+        self._servers[server.id] = server
+        phase = ((server.id * _PHASE_SPREAD) % 1.0) * interval
+        self.state[server.id] = {"interval": interval, "phase": round(phase, 3), "lag": None,
+                                 "last_started": None, "last_duration": None, "skipped": 0}
+        self._push(server.id, time.monotonic() + phase)
+
+    async def refresh(self):
+        """Pick up added, removed and edited servers"""
+        async with self.db_factory() as db:
+            servers = (await db.execute(select(Server))).scalars().all()
+        fleet_state.sync_servers(servers)
+        seen = set()
+        for server in servers:
+            seen.add(server.id)
+            known = self._servers.get(server.id)
+            if known is None or self.interval_for(known) != self.interval_for(server):
+                self._schedule_new(server)
+            else:
+                # Keep the slot, probe with the fresh settings
+                self._servers[server.id] = server
+        for server_id in list(self._servers):
+            if server_id not in seen:
+                self._servers.pop(server_id, None)
+                self._generation.pop(server_id, None)
+                self.state.pop(server_id, None)
+
+    def _dispatch(self, server_id: int, due: float, base: float):
+        now = time.monotonic()
+        interval = self.interval_for(self._servers[server_id])
+        state = self.state[server_id]
+        # Next fixed-rate slot; slots missed while overloaded are skipped, not bunched up
+        next_base = base + interval
+        if next_base <= now:
+            next_base += interval * math.ceil((now - next_base) / interval)
+        self._push(server_id, next_base)
+
+        if server_id in self._running:
+            state["skipped"] += 1
+            return
+        state["lag"] = round(now - due, 3)
+        state["last_started"] = time.time()
+        self._running[server_id] = asyncio.create_task(self._run_probe(self._servers[server_id]))
+        self._window["peak_running"] = max(self._window["peak_running"], len(self._running))
+
+    async def _run_probe(self, server: Server):
+        started = time.monotonic()
+        result = None
+        try:
+            result = await self._probe(server, self._sem)
+            self._record(result)
+            self._store([result])
+        except Exception:
+            pass
+        finally:
+            self._running.pop(server.id, None)
+            state = self.state.get(server.id)
+            if state is not None:
+                state["last_duration"] = round(time.monotonic() - started, 3)
+                if result is not None:
+                    state["last_status"] = result.get("probe_status")
+
+    async def _refresher(self):
+        while True:
+            await asyncio.sleep(settings.monitor_refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                pass
+
+    async def _evaluator(self):
+        while True:
+            await asyncio.sleep(settings.monitor_interval_seconds)
+            try:
+                async with self.db_factory() as db:
+                    await self._evaluate(db)
+            except Exception:
+                pass
+
+    def snapshot(self) -> List[Dict]:
+        now = time.time()
+        return [
+            {"server_id": server_id, **state,
+             "next_due_in": round(state["next_due"] - now, 3) if state.get("next_due") else None,
+             "running": server_id in self._running}
+            for server_id, state in sorted(self.state.items())
+        ]
+
+    async def run(self):
+        await self.refresh()
+        helpers = [asyncio.create_task(self._refresher())]
+        if self._evaluate is not None:
+            helpers.append(asyncio.create_task(self._evaluator()))
+        try:
+            while True:
+                self._wakeup.clear()
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    due, _seq, server_id, generation, base = heapq.heappop(self._heap)
+                    if self._generation.get(server_id) != generation:
+                        continue  # server removed or rescheduled
+                    self._dispatch(server_id, due, base)
+                timeout: Optional[float] = self._heap[0][0] - time.monotonic() if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in helpers:
+                task.cancel()
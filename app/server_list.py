@@ -0,0 +1,141 @@
+import base64
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Integer, and_, func, literal_column, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import MetricLatest, Server
+
+
+# The server list page is chosen in SQL: filters, sort and keyset pagination
+# over servers LEFT JOIN metrics_latest. Sort keys are never NULL (coalesced)
+# and end with the server id, so a page boundary is one (key, id) row value
+# and the next page starts with an index seek instead of skipping rows.
+
+_EMPTY = literal_column("''")
+
+# name -> (key expression, descending by default)
+SORTS: Dict[str, tuple] = {
+    "hostname": (func.lower(Server.hostname), False),
+    "ip": (Server.ip_address, False),
+    "system": (func.lower(func.coalesce(Server.system_name, _EMPTY)), False),
+    "environment": (func.coalesce(Server.environment, _EMPTY), False),
+    "reachable": (func.coalesce(MetricLatest.reachable, literal_column("0"), type_=Integer), True),
+    "cpu": (func.coalesce(MetricLatest.cpu_percent, literal_column("-1")), True),
+    "ram": (func.coalesce(MetricLatest.ram_percent, literal_column("-1")), True),
+}
+
+
+@dataclass
+class ServerPage:
+    ids: List[int]
+    total: int
+    next_cursor: Optional[str]  # after= for the following page
+    prev_cursor: Optional[str]  # before= for the previous page
+
+
+def encode_cursor(values: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[list]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _sort(sort: Optional[str]) -> Tuple[list, bool]:
+    """Sort columns and direction; a leading '-' flips the default direction"""
+    name = (sort or "").lstrip("-")
+    if name not in SORTS:
+        return [Server.id], False
+    key, descending = SORTS[name]
+    if sort.startswith("-"):
+        descending = not descending
+    return [key, Server.id], descending
+
+
+def _filters(q, cluster, reachable, environment, tag, system, owner) -> list:
+    conditions = []
+    if q:
+        conditions.append(or_(
+            Server.hostname.icontains(q, autoescape=True), Server.ip_address.icontains(q, autoescape=True),
+            Server.system_name.icontains(q, autoescape=True), Server.owner.icontains(q, autoescape=True),
+        ))
+    if cluster in {"yes", "no"}:
+        conditions.append(func.coalesce(Server.is_cluster, False) == (cluster == "yes"))
+    if reachable in {"yes", "no"}:
+        conditions.append(func.coalesce(MetricLatest.reachable, False) == (reachable == "yes"))
+    if environment in {"test", "stage", "prod"}:
+        conditions.append(Server.environment == environment)
+    if tag:
+        conditions.append(Server.tags.icontains(tag, autoescape=True))
+    if system:
+        conditions.append(Server.system_name == system)
+    if owner:
+        conditions.append(Server.owner.icontains(owner, autoescape=True))
+    return conditions
+
+
+async def server_page(
+    db: AsyncSession,
+    q: Optional[str] = None,
+    cluster: Optional[str] = None,
+    reachable: Optional[str] = None,
+    environment: Optional[str] = None,
+    tag: Optional[str] = None,
+    system: Optional[str] = None,
+    owner: Optional[str] = None,
+    sort: Optional[str] = None,
+    per_page: int = 20,
+    page: int = 1,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+) -> ServerPage:
+    """Ids of one page of the server list, in display order.
+
+    `after`/`before` are cursors from a previous page (next/previous links);
+    without them the page is found by offset, for jumps to a page number.
+    """
+    columns, descending = _sort(sort)
+    conditions = _filters(q, cluster, reachable, environment, tag, system, owner)
+    base = select(*columns).select_from(Server).outerjoin(MetricLatest, MetricLatest.server_id == Server.id)
+    if conditions:
+        base = base.where(and_(*conditions))
+
+    total = (await db.execute(select(func.count()).select_from(base.subquery()))).scalar_one()
+
+    boundary = decode_cursor(before or after) if (before or after) else None
+    if boundary is not None and len(boundary) != len(columns):
+        boundary = None  # cursor from another sort order
+    backwards = boundary is not None and bool(before)
+    query = base
+    if boundary is not None:
+        row, mark = tuple_(*columns), tuple_(*boundary)
+        lead, value = columns[0], boundary[0]
+        # The plain bound on the leading key is what lets SQLite seek the index; the row value alone scans it
+        if descending != backwards:
+            query = query.where(and_(lead <= value, row < mark))
+        else:
+            query = query.where(and_(lead >= value, row > mark))
+    order = [c.desc() if descending != backwards else c.asc() for c in columns]
+    query = query.order_by(*order).limit(per_page + 1)
+    if boundary is None:
+        query = query.offset((page - 1) * per_page)
+
+    rows = [tuple(r) for r in (await db.execute(query)).all()]
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    has_next = more if not backwards else True
+    has_prev = more if backwards else (boundary is not None or page > 1)
+    return ServerPage(
+        ids=[r[-1] for r in rows],
+        total=total,
+        next_cursor=encode_cursor(rows[-1]) if rows and has_next else None,
+        prev_cursor=encode_cursor(rows[0]) if rows and has_prev else None,
+    )
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import shlex
+from typing import Dict, List, Optional
+
+
+def parse_services(services_to_monitor: Optional[str]) -> List[str]:
+    """Service names from the server's JSON list; invalid input yields no services"""
+    if not services_to_monitor:
+        return []
+    try:
+        services = json.loads(services_to_monitor)
+    except Exception:
+        return []
+    if not isinstance(services, list):
+        return []
+    return [str(s).strip() for s in services if str(s).strip()]
+
+
+_UNIT_SUFFIXES = {
+    "service", "socket", "target", "device", "mount", "automount", "swap", "timer", "path", "slice", "scope",
+}
+
+
+def unit_name(service: str) -> str:
+    """systemctl's Id for a service name: ".service" is added when it has no unit suffix"""
+    return service if service.rpartition(".")[2] in _UNIT_SUFFIXES else service + ".service"
+
+
+def show_command(services: List[str]) -> List[str]:
+    """One systemctl call covering all services; Id maps the output blocks back to the services"""
+    return ["systemctl", "show", "--property=Id,ActiveState", "--", *services]
+
+
+def show_command_line(services: List[str]) -> str:
+    return " ".join(shlex.quote(arg) for arg in show_command(services))
+
+
+def parse_show_output(text: str, services: List[str]) -> Dict[str, bool]:
+    """Map `systemctl show` output (one blank-line separated block per unit) to service -> active.
+
+    Blocks are matched by Id. An alias reports the Id of the unit it points
+    to, so a service without a block of its own takes the block at its
+    argument position.
+    """
+    blocks: List[Dict[str, str]] = []
+    current: Dict[str, str] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            if current:
+                blocks.append(current)
+                current = {}
+            continue
+        key, _, value = line.partition("=")
+        current[key.strip()] = value.strip()
+    if current:
+        blocks.append(current)
+
+    by_id = {block["Id"]: block for block in blocks if block.get("Id")}
+    status: Dict[str, bool] = {}
+    for index, service in enumerate(services):
+        block = by_id.get(unit_name(service))
+        if block is None:
+            block = blocks[index] if index < len(blocks) else {}
+        status[service] = block.get("ActiveState") == "active"
+    return status
+
+
+async def check_local(services: List[str], timeout: float) -> Dict[str, bool]:
+    """All services of this host through one asyncio subprocess"""
+    if not services:
+        return {}
+    proc = await asyncio.create_subprocess_exec(
+        *show_command(services), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        raise
+    return parse_show_output(stdout.decode(errors="replace"), services)
@@ -1,8 +1,15 @@
-from typing import List, Dict, Optional
+import heapq
+from typing import List, Dict, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
-from app.models import Server, Metric, AlertRule, AlertEvent
+from sqlalchemy import select
+from app.models import Server, MetricLatest, AlertRule, AlertEvent
 from datetime import datetime, timedelta
+from app.config import settings
+from app.db_writer import db_writer
+from app.rollups import choose_resolution, get_rollup_history
+from app.ingest import METRIC_COLUMNS, MetricRow
+from app.archive import read_archive
+from app import deadband, partitions
 
 
 class MonitoringService:
@@ -11,31 +18,8 @@ class MonitoringService:
     @staticmethod
     async def get_servers_with_latest_metrics(db: AsyncSession) -> List[Dict]:
         """Get all servers with their latest metrics in a single query"""
-        # Use subquery to get latest metric for each server
-        latest_metrics_subquery = (
-            select(
-                Metric.server_id,
-                func.max(Metric.timestamp).label('latest_timestamp')
-            )
-            .group_by(Metric.server_id)
-            .subquery()
-        )
-        
-        # Join servers with their latest metrics
-        query = (
-            select(Server, Metric)
-            .outerjoin(
-                latest_metrics_subquery,
-                Server.id == latest_metrics_subquery.c.server_id
-            )
-            .outerjoin(
-                Metric,
-                and_(
-                    Metric.server_id == Server.id,
-                    Metric.timestamp == latest_metrics_subquery.c.latest_timestamp
-                )
-            )
-        )
+        # metrics_latest holds one row per server, so this does not depend on history size
+        query = select(Server, MetricLatest).outerjoin(MetricLatest, MetricLatest.server_id == Server.id)
         
         results = await db.execute(query)
         servers_data = []
@@ -64,36 +48,58 @@ class MonitoringService:
                     "network_out_kbps": metric.network_out_kbps if metric else None,
                     "network_io": round(((metric.network_in_kbps or 0) + (metric.network_out_kbps or 0)) / 1024, 2) if metric else None,  # Convert kbps to MB/s
                     "reachable": metric.reachable if metric else None,
+                    "ping_rtt_ms": metric.ping_rtt_ms if metric else None,
+                    "packet_loss": metric.packet_loss if metric else None,
+                    "probe_status": metric.probe_status if metric else None,
                     "services_status": metric.services_status if metric else None,
                     "ports_status": metric.ports_status if metric else None,
+                    "ports_latency": metric.ports_latency if metric else None,
                 } if metric else None
             }
             servers_data.append(server_data)
         
         return servers_data
     
+    @staticmethod
+    async def get_latest_metrics_map(db: AsyncSession, server_ids: Optional[List[int]] = None) -> Dict[int, MetricLatest]:
+        """Latest metric per server id from metrics_latest"""
+        query = select(MetricLatest)
+        if server_ids is not None:
+            query = query.where(MetricLatest.server_id.in_(server_ids))
+        return {m.server_id: m for m in (await db.execute(query)).scalars().all()}
+    
     @staticmethod
     async def get_server_metrics_history(
         db: AsyncSession, 
         server_id: int, 
-        hours: int = 24
+        hours: float = 24,
+        after: Optional[datetime] = None
     ) -> List[Dict]:
-        """Get metrics history for a server"""
+        """Get metrics history for a server (raw rows, including archived hours).
+
+        With `after`, only rows newer than it are returned (incremental refresh).
+        """
         since = datetime.utcnow() - timedelta(hours=hours)
+        if after is not None and after >= since:
+            since = after
         
-        query = (
-            select(Metric)
-            .where(
-                and_(
-                    Metric.server_id == server_id,
-                    Metric.timestamp >= since
-                )
-            )
-            .order_by(Metric.timestamp.asc())
+        # Raw rows are spread over day partitions; read them as one UNION ALL.
+        # Start one deadband heartbeat early so held values have a stored value to carry forward.
+        source = await partitions.range_select(
+            db, list(METRIC_COLUMNS) + [deadband.HELD_COLUMN], lambda t: t.c.server_id == server_id,
+            since - timedelta(seconds=settings.deadband_heartbeat_seconds),
         )
+        live = []
+        if source is not None:
+            query = select(source).order_by(source.c.timestamp.asc())
+            rows = (await db.execute(query)).all()
+            live = [MetricRow(*row) for row in deadband.expand(rows) if row[1] >= since]
         
-        results = await db.execute(query)
-        metrics = results.scalars().all()
+        # Older hours come from the compressed archive, decoded block by block
+        archived = await read_archive(db, server_id, since)
+        metrics = heapq.merge(archived, live, key=lambda m: m.timestamp)
+        if after is not None:
+            metrics = (m for m in metrics if m.timestamp > after)
         
         return [
             {
@@ -110,12 +116,36 @@ class MonitoringService:
                 "network_out_kbps": m.network_out_kbps,
                 "network_io": round(((m.network_in_kbps or 0) + (m.network_out_kbps or 0)) / 1024, 2),  # Convert kbps to MB/s
                 "reachable": m.reachable,
+                "ping_rtt_ms": m.ping_rtt_ms,
+                "packet_loss": m.packet_loss,
+                "probe_status": m.probe_status,
                 "services_status": m.services_status,
                 "ports_status": m.ports_status,
+                "ports_latency": m.ports_latency,
             }
             for m in metrics
         ]
     
+    @staticmethod
+    async def get_server_metrics(
+        db: AsyncSession, server_id: int, minutes: int, max_points: int, after: Optional[datetime] = None
+    ) -> Tuple[int, List[Dict]]:
+        """History for a window, from raw rows or the finest rollup tier that fits max_points.
+
+        Returns (resolution in seconds, 0 for raw rows; points). With `after` (the
+        previous response's cursor) only newer raw rows are returned; for rollup
+        tiers the bucket holding `after` is returned again, as it may have grown.
+        """
+        server = await db.get(Server, server_id)
+        interval = (server.monitor_interval if server is not None else None) or settings.monitor_interval_seconds
+        resolution = choose_resolution(minutes * 60, max_points, interval)
+        if resolution == 0:
+            return 0, await MonitoringService.get_server_metrics_history(db, server_id, minutes / 60, after)
+        since = datetime.utcnow() - timedelta(minutes=minutes)
+        if after is not None and after > since:
+            since = after
+        return resolution, await get_rollup_history(db, server_id, since, resolution)
+    
     @staticmethod
     async def evaluate_alerts_optimized(db: AsyncSession) -> None:
         """Optimized alert evaluation with batch queries"""
@@ -132,31 +162,11 @@ class MonitoringService:
             return
         
         # Get latest metrics for all servers in one query
-        latest_metrics_subquery = (
-            select(
-                Metric.server_id,
-                func.max(Metric.timestamp).label('latest_timestamp')
-            )
-            .where(Metric.server_id.in_(server_ids))
-            .group_by(Metric.server_id)
-            .subquery()
-        )
-        
-        latest_metrics_query = (
-            select(Metric)
-            .join(
-                latest_metrics_subquery,
-                and_(
-                    Metric.server_id == latest_metrics_subquery.c.server_id,
-                    Metric.timestamp == latest_metrics_subquery.c.latest_timestamp
-                )
-            )
-        )
-        
-        latest_metrics = (await db.execute(latest_metrics_query)).scalars().all()
-        metrics_by_server = {m.server_id: m for m in latest_metrics}
+        metrics_by_server = await MonitoringService.get_latest_metrics_map(db, server_ids)
         
         # Evaluate each rule
+        events = []
+        messages = []
         for rule in rules:
             if not rule.server_id:
                 continue
@@ -183,16 +193,25 @@ class MonitoringService:
             val = metric_map.get(rule.metric)
             if _compare_metric(rule.operator, val, rule.threshold):
                 message = f"Rule '{rule.name}' triggered on server {rule.server_id}: {rule.metric} {rule.operator} {rule.threshold} (value={val})"
-                db.add(AlertEvent(rule_id=rule.id, server_id=rule.server_id, value=val, message=message))
-                
-                # Dispatch notifications
-                try:
-                    from app.monitor import dispatch_notifications
-                    await dispatch_notifications(message)
-                except Exception:
-                    pass
-        
-        await db.commit()
+                events.append(AlertEvent(rule_id=rule.id, server_id=rule.server_id, value=val, message=message))
+                messages.append(message)
+
+        if not events:
+            return
+
+        # Events go through the writer task; notifications are sent outside the write transaction
+        async def add_events(writer_db: AsyncSession):
+            writer_db.add_all(events)
+
+        await db_writer.run(add_events)
+
+        # Dispatch notifications
+        from app.monitor import dispatch_notifications
+        for message in messages:
+            try:
+                await dispatch_notifications(message)
+            except Exception:
+                pass
 
 
 def _compare_metric(op: str, value: float | None, threshold: float | None) -> bool:
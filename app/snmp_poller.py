@@ -0,0 +1,248 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from app.encryption import decrypt_password
+from app.models import Server
+
+
+# HOST-RESOURCES-MIB
+HR_SYSTEM_PROCESSES = '1.3.6.1.2.1.25.1.6'  # .0
+HR_PROCESSOR_LOAD = '1.3.6.1.2.1.25.3.3.1.2'
+HR_STORAGE_TYPE = '1.3.6.1.2.1.25.2.3.1.2'
+HR_STORAGE_ALLOC_UNITS = '1.3.6.1.2.1.25.2.3.1.4'
+HR_STORAGE_SIZE = '1.3.6.1.2.1.25.2.3.1.5'
+HR_STORAGE_USED = '1.3.6.1.2.1.25.2.3.1.6'
+# hrStorageType values
+HR_STORAGE_RAM = '1.3.6.1.2.1.25.2.1.2'
+HR_STORAGE_FIXED_DISK = '1.3.6.1.2.1.25.2.1.4'
+
+# Short timeouts, no retries: an unreachable agent must not hold a probe slot
+SNMP_TIMEOUT = 1.5
+SNMP_RETRIES = 0
+MAX_REPETITIONS = 32
+MAX_VARBINDS_PER_PDU = 40
+
+
+class _Layout:
+    """Per-server discovered table indexes; lets later cycles skip the walks"""
+
+    def __init__(self, fingerprint: Tuple):
+        self.fingerprint = fingerprint
+        self.cpu_indexes: List[str] = []
+        self.ram_index: Optional[str] = None
+        self.disk_indexes: List[str] = []
+        self.alloc_units: Dict[str, int] = {}
+
+
+def _is_value(val) -> bool:
+    # noSuchObject / noSuchInstance / endOfMibView are exceptions, not values
+    return val is not None and val.__class__.__name__ not in {"NoSuchObject", "NoSuchInstance", "EndOfMibView", "Null"}
+
+
+def _flatten(var_binds) -> list:
+    # pysnmp returns bulk responses either flat or as a table of rows depending on version
+    flat = []
+    for item in var_binds:
+        if isinstance(item, (list, tuple)) and item and isinstance(item[0], (list, tuple)):
+            flat.extend(item)
+        else:
+            flat.append(item)
+    return flat
+
+
+class SnmpPoller:
+    """One long-lived SnmpEngine shared by the whole monitor.
+
+    Requests to different agents are in flight concurrently over the
+    engine's single transport. The first poll of a server fetches
+    processes, processor load and the storage table in one GETBULK
+    (continued only while columns remain); later polls GET just the
+    hrProcessorLoad, hrStorageSize and hrStorageUsed instances that matter.
+    """
+
+    def __init__(self):
+        self._engine = None
+        self._loop = None
+        self._targets: Dict[str, object] = {}
+        self._layouts: Dict[int, _Layout] = {}
+
+    def _get_engine(self):
+        from pysnmp.hlapi.v3arch.asyncio import SnmpEngine
+        loop = asyncio.get_running_loop()
+        if self._engine is None or self._loop is not loop:
+            self.close()
+            self._engine = SnmpEngine()
+            self._loop = loop
+        return self._engine
+
+    def close(self):
+        if self._engine is not None:
+            try:
+                self._engine.close_dispatcher()
+            except Exception:
+                pass
+        self._engine = None
+        self._targets.clear()
+
+    def forget(self, server_id: int):
+        self._layouts.pop(server_id, None)
+
+    async def _target(self, host: str):
+        from pysnmp.hlapi.v3arch.asyncio import UdpTransportTarget
+        target = self._targets.get(host)
+        if target is None:
+            target = await UdpTransportTarget.create((host, 161), timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES)
+            self._targets[host] = target
+        return target
+
+    async def _discover(self, engine, community, target, ctx, fingerprint: Tuple) -> Tuple[_Layout, Dict]:
+        from pysnmp.hlapi.v3arch.asyncio import ObjectType, ObjectIdentity, bulk_cmd
+
+        columns = [HR_PROCESSOR_LOAD, HR_STORAGE_TYPE, HR_STORAGE_ALLOC_UNITS, HR_STORAGE_SIZE, HR_STORAGE_USED]
+        rows: Dict[str, Dict[str, object]] = {c: {} for c in columns}
+        processes = None
+        cursors = {c: c for c in columns}
+        first = True
+        while cursors:
+            # hrSystemProcesses rides along as a non-repeater on the first PDU only
+            non_repeaters = [ObjectType(ObjectIdentity(HR_SYSTEM_PROCESSES))] if first else []
+            active = list(cursors)
+            err_ind, err_stat, _err_idx, var_binds = await bulk_cmd(
+                engine, community, target, ctx, len(non_repeaters), MAX_REPETITIONS,
+                *non_repeaters, *(ObjectType(ObjectIdentity(cursors[c])) for c in active),
+                lookupMib=False,
+            )
+            if err_ind or err_stat:
+                break
+            var_binds = _flatten(var_binds)
+            if first and var_binds:
+                name, val = var_binds[0]
+                if str(name).startswith(HR_SYSTEM_PROCESSES + '.') and _is_value(val):
+                    processes = int(val)
+                var_binds = var_binds[1:]
+            first = False
+            # Repeater results come row by row, one varbind per active column
+            advanced = False
+            for position, column in enumerate(active):
+                prefix = column + '.'
+                done = False
+                for name, val in var_binds[position::len(active)]:
+                    oid = str(name)
+                    if not oid.startswith(prefix) or not _is_value(val):
+                        done = True
+                        break
+                    rows[column][oid[len(prefix):]] = val
+                    cursors[column] = oid
+                    advanced = True
+                if done:
+                    cursors.pop(column, None)
+            if not advanced:
+                break
+
+        layout = _Layout(fingerprint)
+        layout.cpu_indexes = sorted(rows[HR_PROCESSOR_LOAD])
+        for index, storage_type in rows[HR_STORAGE_TYPE].items():
+            kind = str(storage_type)
+            try:
+                layout.alloc_units[index] = int(rows[HR_STORAGE_ALLOC_UNITS][index])
+            except (KeyError, ValueError, TypeError):
+                continue
+            if kind.endswith(HR_STORAGE_RAM) and layout.ram_index is None:
+                layout.ram_index = index
+            elif kind.endswith(HR_STORAGE_FIXED_DISK):
+                layout.disk_indexes.append(index)
+
+        values = {"processes": processes}
+        for column in (HR_PROCESSOR_LOAD, HR_STORAGE_SIZE, HR_STORAGE_USED):
+            for index, val in rows[column].items():
+                values[f"{column}.{index}"] = val
+        return layout, values
+
+    async def _get_known(self, engine, community, target, ctx, layout: _Layout) -> Optional[Dict]:
+        from pysnmp.hlapi.v3arch.asyncio import ObjectType, ObjectIdentity, get_cmd
+
+        oids = [HR_SYSTEM_PROCESSES + '.0']
+        oids += [f"{HR_PROCESSOR_LOAD}.{i}" for i in layout.cpu_indexes]
+        for index in ([layout.ram_index] if layout.ram_index else []) + layout.disk_indexes:
+            oids += [f"{HR_STORAGE_SIZE}.{index}", f"{HR_STORAGE_USED}.{index}"]
+
+        chunks = [oids[i:i + MAX_VARBINDS_PER_PDU] for i in range(0, len(oids), MAX_VARBINDS_PER_PDU)]
+        responses = await asyncio.gather(*(
+            get_cmd(engine, community, target, ctx, *(ObjectType(ObjectIdentity(o)) for o in chunk), lookupMib=False)
+            for chunk in chunks
+        ))
+        values: Dict = {"processes": None}
+        for err_ind, err_stat, _err_idx, var_binds in responses:
+            if err_ind or err_stat:
+                return None
+            for name, val in var_binds:
+                oid = str(name)
+                if not _is_value(val):
+                    if not oid.startswith(HR_SYSTEM_PROCESSES):
+                        # Table was renumbered (agent restart, disk added): rediscover
+                        return None
+                    continue
+                if oid.startswith(HR_SYSTEM_PROCESSES):
+                    values["processes"] = int(val)
+                else:
+                    values[oid] = val
+        return values
+
+    async def collect(self, server: Server) -> Dict[str, Optional[float]]:
+        """Return cpu/ram/disk/processes for one server; missing values are None"""
+        from pysnmp.hlapi.v3arch.asyncio import CommunityData, ContextData
+
+        engine = self._get_engine()
+        target = await self._target(server.ip_address)
+        snmp_community = decrypt_password(server.snmp_community) if server.snmp_community else "public"
+        community = CommunityData(snmp_community, mpModel=1)
+        ctx = ContextData()
+
+        fingerprint = (server.ip_address, server.snmp_community)
+        layout = self._layouts.get(server.id)
+        values = None
+        if layout is not None and layout.fingerprint == fingerprint:
+            values = await self._get_known(engine, community, target, ctx, layout)
+        if values is None:
+            layout, values = await self._discover(engine, community, target, ctx, fingerprint)
+            if layout.cpu_indexes or layout.alloc_units:
+                self._layouts[server.id] = layout
+            else:
+                # Agent unreachable or without HOST-RESOURCES-MIB: try discovery again next cycle
+                self._layouts.pop(server.id, None)
+
+        result: Dict[str, Optional[float]] = {"cpu": None, "ram": None, "disk": None, "processes": values.get("processes")}
+
+        cpu_values = []
+        for index in layout.cpu_indexes:
+            try:
+                cpu_values.append(float(values[f"{HR_PROCESSOR_LOAD}.{index}"]))
+            except (KeyError, ValueError, TypeError):
+                pass
+        if cpu_values:
+            result["cpu"] = sum(cpu_values) / len(cpu_values)
+
+        def storage(index: str) -> Optional[Tuple[int, int]]:
+            try:
+                au = layout.alloc_units[index]
+                return int(values[f"{HR_STORAGE_SIZE}.{index}"]) * au, int(values[f"{HR_STORAGE_USED}.{index}"]) * au
+            except (KeyError, ValueError, TypeError):
+                return None
+
+        if layout.ram_index:
+            ram = storage(layout.ram_index)
+            if ram and ram[0] > 0:
+                result["ram"] = (ram[1] / ram[0]) * 100.0
+        # Disk: aggregate fixed disks
+        total_disk = used_disk = 0
+        for index in layout.disk_indexes:
+            disk = storage(index)
+            if disk:
+                total_disk += disk[0]
+                used_disk += disk[1]
+        if total_disk > 0:
+            result["disk"] = (used_disk / total_disk) * 100.0
+        return result
+
+
+# Shared poller for all SNMP-sourced servers
+snmp_poller = SnmpPoller()
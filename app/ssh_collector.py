@@ -0,0 +1,207 @@
+import re
+from typing import Dict, List, Optional
+from app.service_checker import parse_show_output, show_command_line
+
+
+# One exec per cycle: dump the raw kernel counters, parse and diff them here.
+# Section markers keep the output format independent of file contents.
+COLLECT_COMMAND = (
+    "LANG=C; "
+    "echo '@uptime'; cat /proc/uptime; "
+    "echo '@stat'; head -n 1 /proc/stat; "
+    "echo '@meminfo'; cat /proc/meminfo; "
+    "echo '@loadavg'; cat /proc/loadavg; "
+    "echo '@netdev'; cat /proc/net/dev; "
+    "echo '@diskstats'; cat /proc/diskstats; "
+    "echo '@statvfs'; stat -f -c '%S %b %f %a' /; "
+    "echo '@procs'; set -- /proc/[0-9]*; echo $#; "
+    "echo '@temp'; cat /sys/class/thermal/thermal_zone0/temp 2>/dev/null; "
+    "true"
+)
+
+
+def collect_command(services: Optional[List[str]] = None) -> str:
+    """Collector command, with one `systemctl show` for the monitored services appended"""
+    if not services:
+        return COLLECT_COMMAND
+    return COLLECT_COMMAND + "; echo '@services'; " + show_command_line(services) + " 2>/dev/null; true"
+
+
+SECTOR_BYTES = 512
+_PARTITION_SUFFIX = re.compile(r"p?\d+$")
+_VIRTUAL_DISKS = ("loop", "ram", "zram", "fd", "sr")
+
+
+def _split_sections(text: str) -> Dict[str, list]:
+    sections: Dict[str, list] = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("@"):
+            current = line[1:].strip()
+            sections[current] = []
+        elif current is not None and (line.strip() or current == "services"):
+            # Blank lines separate the per-unit blocks of `systemctl show`
+            sections[current].append(line)
+    return sections
+
+
+def _whole_disks(names) -> set:
+    """Drop partitions (sda1, nvme0n1p2) and virtual devices so I/O is not double counted"""
+    names = [n for n in names if not n.startswith(_VIRTUAL_DISKS) and not n.startswith("dm-")]
+    disks = set(names)
+    for name in names:
+        for other in names:
+            if other != name and name.startswith(other) and _PARTITION_SUFFIX.fullmatch(name[len(other):]):
+                disks.discard(name)
+                break
+    return disks
+
+
+def parse_payload(text: str, services: Optional[List[str]] = None) -> Dict:
+    """Parse collector output into a structured payload of gauges and raw counters"""
+    sections = _split_sections(text)
+    payload: Dict = {}
+
+    if services:
+        payload["services"] = parse_show_output("\n".join(sections.get("services", [])), services)
+
+    try:
+        payload["uptime"] = float(sections["uptime"][0].split()[0])
+    except (KeyError, IndexError, ValueError):
+        payload["uptime"] = None
+
+    try:
+        fields = [float(v) for v in sections["stat"][0].split()[1:]]
+        # user nice system idle iowait irq softirq steal (guest time is already in user/nice)
+        total = sum(fields[:8])
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0.0)
+        payload["cpu"] = {"busy": total - idle, "total": total}
+    except (KeyError, IndexError, ValueError):
+        payload["cpu"] = None
+
+    meminfo: Dict[str, int] = {}
+    for line in sections.get("meminfo", []):
+        key, _, rest = line.partition(":")
+        try:
+            meminfo[key.strip()] = int(rest.split()[0])  # kB
+        except (IndexError, ValueError):
+            continue
+    payload["meminfo"] = meminfo
+
+    try:
+        parts = sections["loadavg"][0].split()
+        payload["loadavg"] = [float(parts[0]), float(parts[1]), float(parts[2])]
+    except (KeyError, IndexError, ValueError):
+        payload["loadavg"] = None
+
+    net = {"rx_bytes": 0, "tx_bytes": 0}
+    for line in sections.get("netdev", []):
+        if ":" not in line:
+            continue  # header lines
+        iface, _, rest = line.partition(":")
+        if iface.strip() == "lo":
+            continue
+        cols = rest.split()
+        try:
+            net["rx_bytes"] += int(cols[0])
+            net["tx_bytes"] += int(cols[8])
+        except (IndexError, ValueError):
+            continue
+    payload["net"] = net
+
+    rows = {}
+    for line in sections.get("diskstats", []):
+        cols = line.split()
+        if len(cols) >= 10:
+            rows[cols[2]] = cols
+    disk_io = {"read_bytes": 0, "write_bytes": 0}
+    for name in _whole_disks(rows):
+        try:
+            disk_io["read_bytes"] += int(rows[name][5]) * SECTOR_BYTES
+            disk_io["write_bytes"] += int(rows[name][9]) * SECTOR_BYTES
+        except ValueError:
+            continue
+    payload["disk_io"] = disk_io
+
+    try:
+        bsize, blocks, bfree, bavail = (int(v) for v in sections["statvfs"][0].split()[:4])
+        payload["statvfs"] = {"bsize": bsize, "blocks": blocks, "bfree": bfree, "bavail": bavail}
+    except (KeyError, IndexError, ValueError):
+        payload["statvfs"] = None
+
+    try:
+        payload["processes"] = int(sections["procs"][0].strip())
+    except (KeyError, IndexError, ValueError):
+        payload["processes"] = None
+
+    try:
+        payload["cpu_temp"] = int(sections["temp"][0].strip()) / 1000.0
+    except (KeyError, IndexError, ValueError):
+        payload["cpu_temp"] = None
+
+    return payload
+
+
+# Last payload per server id, used to turn counters into rates on the next cycle
+_previous: Dict[int, Dict] = {}
+
+
+def forget(server_id: int) -> None:
+    _previous.pop(server_id, None)
+
+
+def compute_metrics(server_id: int, payload: Dict) -> Dict[str, Optional[float]]:
+    """Gauges from this payload plus rates from the delta to the previous one"""
+    metrics: Dict[str, Optional[float]] = {
+        "cpu": None, "cpu_temp": payload.get("cpu_temp"), "ram": None, "swap": None, "disk": None,
+        "disk_read": None, "disk_write": None, "processes": payload.get("processes"),
+        "in_kbps": None, "out_kbps": None,
+    }
+
+    mem = payload.get("meminfo") or {}
+    total = mem.get("MemTotal")
+    if total:
+        available = mem.get("MemAvailable")
+        if available is None:
+            available = mem.get("MemFree", 0) + mem.get("Buffers", 0) + mem.get("Cached", 0)
+        metrics["ram"] = round((total - available) * 100.0 / total, 2)
+    if "SwapTotal" in mem:
+        swap_total = mem["SwapTotal"]
+        metrics["swap"] = round((swap_total - mem.get("SwapFree", 0)) * 100.0 / swap_total, 2) if swap_total else 0.0
+
+    vfs = payload.get("statvfs")
+    if vfs:
+        used = vfs["blocks"] - vfs["bfree"]
+        # Same formula as df: reserved blocks count as unavailable
+        denominator = used + vfs["bavail"]
+        if denominator > 0:
+            metrics["disk"] = round(used * 100.0 / denominator, 2)
+
+    prev = _previous.get(server_id)
+    _previous[server_id] = payload
+    if not prev or prev.get("uptime") is None or payload.get("uptime") is None:
+        return metrics
+    elapsed = payload["uptime"] - prev["uptime"]
+    if elapsed <= 0:
+        # Host rebooted since the last cycle; counters restarted
+        return metrics
+
+    if payload.get("cpu") and prev.get("cpu"):
+        d_total = payload["cpu"]["total"] - prev["cpu"]["total"]
+        d_busy = payload["cpu"]["busy"] - prev["cpu"]["busy"]
+        if d_total > 0:
+            metrics["cpu"] = round(max(0.0, min(100.0, d_busy * 100.0 / d_total)), 1)
+
+    d_rx = payload["net"]["rx_bytes"] - prev["net"]["rx_bytes"]
+    d_tx = payload["net"]["tx_bytes"] - prev["net"]["tx_bytes"]
+    if d_rx >= 0 and d_tx >= 0:
+        metrics["in_kbps"] = d_rx * 8 / 1024 / elapsed
+        metrics["out_kbps"] = d_tx * 8 / 1024 / elapsed
+
+    d_read = payload["disk_io"]["read_bytes"] - prev["disk_io"]["read_bytes"]
+    d_write = payload["disk_io"]["write_bytes"] - prev["disk_io"]["write_bytes"]
+    if d_read >= 0 and d_write >= 0:
+        metrics["disk_read"] = d_read / (1024 * 1024) / elapsed
+        metrics["disk_write"] = d_write / (1024 * 1024) / elapsed
+
+    return metrics
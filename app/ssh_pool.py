@@ -0,0 +1,179 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.config import settings
+from app.encryption import decrypt_password
+from app.models import Server
+
+
+def _fingerprint(server: Server) -> Tuple:
+    """Connection-relevant server fields; a change forces a reconnect"""
+    return (server.ssh_host, server.ssh_port or 22, server.ssh_username, server.ssh_password)
+
+
+class _PooledConnection:
+    def __init__(self, conn, fingerprint: Tuple):
+        self.conn = conn
+        self.fingerprint = fingerprint
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class SSHPool:
+    """Keyed, bounded pool of live asyncssh connections reused across monitor cycles.
+
+    Connections are keyed by server id, kept alive with SSH keepalives,
+    closed after `idle_seconds` without use and re-established when the
+    server's ssh_* fields change or the transport drops. `max_size` is a soft
+    bound: only idle connections are evicted to make room, so while every
+    pooled connection is running a command a new one is opened anyway.
+    """
+
+    def __init__(self, max_size: int, idle_seconds: float, keepalive_interval: float, keepalive_count_max: int):
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count_max = keepalive_count_max
+        self._entries: "OrderedDict[int, _PooledConnection]" = OrderedDict()
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    async def close_all(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for entry in self._entries.values():
+            entry.close()
+        self._entries.clear()
+
+    def invalidate(self, server_id: int):
+        """Drop a server's connection, e.g. after its SSH settings were edited or it was deleted"""
+        entry = self._entries.pop(server_id, None)
+        if entry is not None:
+            entry.close()
+        self._drop_lock(server_id)
+
+    def _drop_lock(self, server_id: int):
+        # A held lock stays: a second lock for the same server would allow two connects
+        lock = self._locks.get(server_id)
+        if lock is not None and not lock.locked():
+            del self._locks[server_id]
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(max(1.0, min(self.idle_seconds, 60)))
+            self.evict_idle()
+
+    def evict_idle(self):
+        now = time.monotonic()
+        for server_id, entry in list(self._entries.items()):
+            if entry.closed or (entry.in_use == 0 and now - entry.last_used > self.idle_seconds):
+                self._entries.pop(server_id, None)
+                entry.close()
+        for server_id in [sid for sid in self._locks if sid not in self._entries]:
+            self._drop_lock(server_id)
+
+    def _make_room(self):
+        # Evict least recently used idle connections until below the bound (busy ones are kept)
+        while len(self._entries) >= self.max_size:
+            victim = next((sid for sid, e in self._entries.items() if e.in_use == 0), None)
+            if victim is None:
+                return
+            self._entries.pop(victim).close()
+
+    async def _connect(self, server: Server, fingerprint: Tuple) -> _PooledConnection:
+        import asyncssh  # lightweight alternative to paramiko in async
+
+        entry_ref = []
+
+        class _Client(asyncssh.SSHClient):
+            def connection_lost(self, exc):
+                # Transport dropped (keepalive timeout, remote reboot): mark for reconnect
+                if entry_ref:
+                    entry_ref[0].closed = True
+
+        ssh_password = decrypt_password(server.ssh_password) if server.ssh_password else None
+        conn = await asyncssh.connect(
+            server.ssh_host, port=server.ssh_port or 22, username=server.ssh_username,
+            password=ssh_password, known_hosts=None, client_factory=_Client,
+            keepalive_interval=self.keepalive_interval, keepalive_count_max=self.keepalive_count_max,
+            connect_timeout=settings.ssh_timeout, login_timeout=settings.ssh_timeout,
+        )
+        entry = _PooledConnection(conn, fingerprint)
+        entry_ref.append(entry)
+        return entry
+
+    async def _acquire(self, server: Server) -> Tuple[_PooledConnection, bool]:
+        """Return (entry, reused) with the entry marked in use"""
+        fingerprint = _fingerprint(server)
+        lock = self._locks.setdefault(server.id, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(server.id)
+            if entry is not None and (entry.closed or entry.fingerprint != fingerprint):
+                self._entries.pop(server.id, None)
+                entry.close()
+                entry = None
+            reused = entry is not None
+            if entry is None:
+                self._make_room()
+                entry = await self._connect(server, fingerprint)
+                self._entries[server.id] = entry
+            self._entries.move_to_end(server.id)
+            entry.in_use += 1
+            return entry, reused
+
+    def _release(self, entry: _PooledConnection):
+        entry.in_use -= 1
+        entry.last_used = time.monotonic()
+
+    def _discard(self, server_id: int, entry: _PooledConnection):
+        if self._entries.get(server_id) is entry:
+            self._entries.pop(server_id, None)
+        entry.close()
+
+    async def run(self, server: Server, command: str, **kwargs):
+        """Run a command over the server's pooled connection.
+
+        A reused connection that turns out to be dead is replaced and the
+        command retried once on a fresh one.
+        """
+        import asyncssh
+
+        for attempt in range(2):
+            entry, reused = await self._acquire(server)
+            try:
+                return await entry.conn.run(command, **kwargs)
+            except (asyncssh.ChannelOpenError, asyncssh.ConnectionLost, asyncssh.DisconnectError, OSError):
+                self._discard(server.id, entry)
+                if not reused or attempt:
+                    raise
+            except asyncio.CancelledError:
+                # Deadline hit mid-command: don't leave a half-used channel on a pooled connection
+                self._discard(server.id, entry)
+                raise
+            finally:
+                self._release(entry)
+
+
+ssh_pool = SSHPool(
+    max_size=settings.ssh_pool_max_connections,
+    idle_seconds=settings.ssh_pool_idle_seconds,
+    keepalive_interval=settings.ssh_keepalive_interval,
+    keepalive_count_max=settings.ssh_keepalive_count_max,
+)
@@ -0,0 +1,215 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, bindparam, event, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models import MetricLatest, Server, StateInterval
+from app.checks import parse_checks
+
+
+# Ingest-time change detector. Every host, service and port state is kept as
+# intervals (started_at, ended_at) in state_intervals; a row is written only
+# when a state flips, so availability never needs the raw samples.
+
+Subject = Tuple[int, str, str]  # server_id, kind, name
+_current: Dict[Subject, Tuple[bool, datetime]] = {}  # committed open intervals -> (up, started_at)
+_loaded = False
+_PENDING = "state_transitions"  # session.info key: open intervals changed in the current transaction (None = closed)
+
+_intervals = StateInterval.__table__
+_CLOSE = (
+    update(_intervals)
+    .where(and_(
+        _intervals.c.server_id == bindparam("s"), _intervals.c.kind == bindparam("k"),
+        _intervals.c.name == bindparam("n"), _intervals.c.ended_at.is_(None),
+    ))
+    .values(ended_at=bindparam("e"))
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    pending = session.info.pop(_PENDING, None)
+    for key, state in (pending or {}).items():
+        if state is None:
+            _current.pop(key, None)
+        else:
+            _current[key] = state
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+def _observations(row: tuple, positions: Dict[str, int]) -> List[Tuple[str, str, bool]]:
+    states = []
+    reachable = row[positions["reachable"]]
+    if reachable is not None:
+        states.append(("host", "", bool(reachable)))
+    for kind, name, ok, _latency in parse_checks(
+        row[positions["services_status"]], row[positions["ports_status"]], row[positions["ports_latency"]]
+    ):
+        states.append((kind, name, ok))
+    return states
+
+
+async def _load(db: AsyncSession):
+    global _loaded
+    t = StateInterval
+    rows = (await db.execute(
+        select(t.server_id, t.kind, t.name, t.up, t.started_at).where(t.ended_at.is_(None))
+    )).all()
+    _current.update({(r.server_id, r.kind, r.name): (r.up, r.started_at) for r in rows})
+    _loaded = True
+
+
+async def record_transitions(db: AsyncSession, rows: List[tuple], positions: Dict[str, int]) -> int:
+    """Close and open intervals for every state change in metric rows. Does not commit.
+
+    positions maps column name -> index in the metric row. The in-memory open
+    intervals only take the changes once the transaction commits. A service or
+    port missing from a sample that reports that kind of check was removed from
+    the server; its interval is closed there.
+    """
+    if not _loaded:
+        await _load(db)
+    pending: Dict[Subject, Optional[Tuple[bool, datetime]]] = db.info.setdefault(_PENDING, {})
+    opened: Dict[Subject, Dict] = {}  # intervals opened by this call, not written yet
+    new_rows: List[Dict] = []
+    closes: List[Dict] = []
+
+    ts_pos, server_pos = positions["timestamp"], positions["server_id"]
+    reported = {"service": positions["services_status"], "port": positions["ports_status"]}
+    checks: Dict[int, set] = {}  # server_id -> (kind, name) of its open service/port intervals
+    for key in [*_current, *pending]:
+        if key[1] in reported and (pending[key] if key in pending else _current[key]) is not None:
+            checks.setdefault(key[0], set()).add(key[1:])
+
+    def state_of(key: Subject) -> Optional[Tuple[bool, datetime]]:
+        return pending[key] if key in pending else _current.get(key)
+
+    def close(key: Subject, ts: datetime):
+        if key in opened:
+            opened[key]["ended_at"] = ts
+        else:
+            closes.append({"s": key[0], "k": key[1], "n": key[2], "e": ts})
+
+    for row in sorted(rows, key=lambda r: r[ts_pos]):
+        ts, server = row[ts_pos], row[server_pos]
+        observed = _observations(row, positions)
+        gone = {c for c in checks.get(server, ()) if row[reported[c[0]]] is not None}
+        gone -= {(kind, name) for kind, name, _up in observed}
+        for kind, name in gone:
+            key = (server, kind, name)
+            if ts > state_of(key)[1]:
+                close(key, ts)
+                pending[key] = None
+                checks[server].discard((kind, name))
+        for kind, name, up in observed:
+            key = (server, kind, name)
+            state = state_of(key)
+            if state is not None:
+                # Same state, or a late sample from before the current interval
+                if state[0] == up or ts <= state[1]:
+                    continue
+                close(key, ts)
+            if kind in reported:
+                checks.setdefault(server, set()).add((kind, name))
+            interval = {"server_id": key[0], "kind": kind, "name": name, "up": up, "started_at": ts, "ended_at": None}
+            opened[key] = interval
+            new_rows.append(interval)
+            pending[key] = (up, ts)
+
+    if closes:
+        await db.execute(_CLOSE, closes)
+    if new_rows:
+        await db.execute(insert(_intervals), new_rows)
+    return len(new_rows)
+
+
+async def get_uptime(
+    db: AsyncSession,
+    since: datetime,
+    until: datetime,
+    kind: str = "host",
+    name: Optional[str] = None,
+    server_id: Optional[int] = None,
+    environment: Optional[str] = None,
+) -> List[Dict]:
+    """Up/down seconds and availability per server over [since, until], from the interval log.
+
+    Time not covered by any interval (before monitoring started, gaps in the
+    log) counts as unknown and is left out of availability. An open interval
+    only runs to the server's last stored sample, so time the monitor was not
+    running is unknown too. `changes` counts flips inside the window: an
+    interval starting where one with the other state ended.
+    """
+    servers = select(Server.id, Server.hostname, Server.environment).order_by(Server.id)
+    if server_id is not None:
+        servers = servers.where(Server.id == server_id)
+    if environment:
+        servers = servers.where(Server.environment == environment)
+    stats = {
+        s.id: {"server_id": s.id, "hostname": s.hostname, "environment": s.environment,
+               "up_seconds": 0.0, "down_seconds": 0.0, "changes": 0}
+        for s in (await db.execute(servers)).all()
+    }
+    if not stats:
+        return []
+
+    t = StateInterval
+    query = (
+        select(t.server_id, t.name, t.up, t.started_at, t.ended_at, MetricLatest.timestamp.label("last_sample"))
+        .outerjoin(MetricLatest, MetricLatest.server_id == t.server_id)
+        .where(and_(t.kind == kind, t.started_at < until, or_(t.ended_at.is_(None), t.ended_at > since)))
+        .order_by(t.server_id, t.name, t.started_at)
+    )
+    if name is not None:
+        query = query.where(t.name == name)
+    if server_id is not None:
+        query = query.where(t.server_id == server_id)
+    previous = None
+    for row in (await db.execute(query)).all():
+        entry = stats.get(row.server_id)
+        if entry is None:
+            continue
+        start = max(row.started_at, since)
+        end = min(row.ended_at or row.last_sample or row.started_at, until)
+        if end > start:
+            entry["up_seconds" if row.up else "down_seconds"] += (end - start).total_seconds()
+        # Rows come ordered per subject, so a flip's predecessor (ended > since) is the row before
+        if (row.started_at > since and previous is not None
+                and (previous.server_id, previous.name) == (row.server_id, row.name)
+                and previous.ended_at == row.started_at and previous.up != row.up):
+            entry["changes"] += 1
+        previous = row
+
+    window = (until - since).total_seconds()
+    for entry in stats.values():
+        _finish(entry, window)
+    return list(stats.values())
+
+
+def _finish(entry: Dict, window: float):
+    covered = entry["up_seconds"] + entry["down_seconds"]
+    entry["unknown_seconds"] = round(max(window - covered, 0.0), 1)
+    entry["availability"] = round(entry["up_seconds"] / covered, 6) if covered else None
+    entry["up_seconds"] = round(entry["up_seconds"], 1)
+    entry["down_seconds"] = round(entry["down_seconds"], 1)
+
+
+def uptime_by_environment(per_server: List[Dict], window: float) -> List[Dict]:
+    """Sum per-server uptime into environments"""
+    groups: Dict[Optional[str], Dict] = {}
+    for entry in per_server:
+        group = groups.setdefault(entry["environment"], {
+            "environment": entry["environment"], "servers": 0, "up_seconds": 0.0, "down_seconds": 0.0, "changes": 0,
+        })
+        group["servers"] += 1
+        group["up_seconds"] += entry["up_seconds"]
+        group["down_seconds"] += entry["down_seconds"]
+        group["changes"] += entry["changes"]
+    for group in groups.values():
+        _finish(group, window * group["servers"])
+    return sorted(groups.values(), key=lambda g: g["environment"] or "")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк записи метрик: ORM (Metric на строку) против bulk insert (app.ingest)
+
+raw  - только вставка в дневную партицию
+bulk - полный insert_metrics: партиция, metrics_latest, роллапы, check_results, интервалы состояний
+
+Запуск: python bench_ingest.py [--servers 1000 10000] [--rounds 3]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Metric
+from app.ingest import METRIC_COLUMNS, insert_metrics, insert_rows, metric_row
+from app import partitions
+
+
+def fake_results(servers: int):
+    now = datetime.utcnow()
+    for server_id in range(1, servers + 1):
+        yield {
+            "server_id": server_id, "timestamp": now,
+            "cpu": random.uniform(0, 100), "cpu_temp": random.uniform(30, 80),
+            "ram": random.uniform(0, 100), "swap": random.uniform(0, 10), "disk": random.uniform(0, 100),
+            "disk_read": random.uniform(0, 50), "disk_write": random.uniform(0, 50),
+            "processes": random.randint(50, 500), "in_kbps": random.uniform(0, 1e4), "out_kbps": random.uniform(0, 1e4),
+            "reachable": True, "ping_rtt_ms": random.uniform(0.1, 20), "packet_loss": 0.0,
+            "services_status": '{"nginx": true}', "ports_status": '{"443": true}', "ports_latency": '{"443": 0.4}',
+            "probe_status": "ok", "probe_duration_ms": random.uniform(5, 500),
+        }
+
+
+async def orm_path(session_factory, results):
+    async with session_factory() as db:
+        for r in results:
+            db.add(Metric(
+                server_id=r["server_id"], timestamp=r["timestamp"], cpu_percent=r["cpu"], cpu_temp=r["cpu_temp"],
+                ram_percent=r["ram"], swap_percent=r["swap"], disk_percent=r["disk"],
+                disk_io_read=r["disk_read"], disk_io_write=r["disk_write"], processes=r["processes"],
+                network_in_kbps=r["in_kbps"], network_out_kbps=r["out_kbps"], reachable=r["reachable"],
+                ping_rtt_ms=r["ping_rtt_ms"], packet_loss=r["packet_loss"], services_status=r["services_status"],
+                ports_status=r["ports_status"], ports_latency=r["ports_latency"], probe_status=r["probe_status"],
+                probe_duration_ms=r["probe_duration_ms"],
+            ))
+        await db.commit()
+
+
+async def raw_path(session_factory, results):
+    async with session_factory() as db:
+        rows = [metric_row(r) for r in results]
+        table = await partitions.ensure_partition(db, rows[0][1].date())
+        await insert_rows(db, table, METRIC_COLUMNS, rows)
+        await db.commit()
+
+
+async def bulk_path(session_factory, results):
+    async with session_factory() as db:
+        await insert_metrics(db, (metric_row(r) for r in results))
+        await db.commit()
+
+
+async def run(servers_list, rounds):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        print(f"{'servers':>8} {'path':>5} {'rows/s':>12} {'ms/cycle':>10}")
+        for servers in servers_list:
+            for name, path in (("orm", orm_path), ("raw", raw_path), ("bulk", bulk_path)):
+                best = None
+                for _ in range(rounds):
+                    # Every round is a new monitor cycle (fresh timestamps)
+                    results = list(fake_results(servers))
+                    started = time.perf_counter()
+                    await path(session_factory, results)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                print(f"{servers:>8} {name:>5} {servers / best:>12.0f} {best * 1000:>10.1f}")
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metric ingest benchmark")
+    parser.add_argument("--servers", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.servers, args.rounds))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,58 @@
 // Server Check Application JavaScript
 
+// Live updates: one EventSource per page and server filter, shared by every handler.
+// Each event carries /api/servers entries for servers with new results; the first one
+// has the current state of all subscribed servers. Without EventSource, /api/servers
+// is polled instead (ETag revalidation keeps unchanged polls cheap).
+const liveStreams = {};
+
+function subscribeUpdates(serverIds, onServers) {
+    const key = serverIds ? serverIds.join(',') : '';
+    let stream = liveStreams[key];
+    if (!stream) {
+        stream = liveStreams[key] = { handlers: [], state: {} };
+        const deliver = servers => {
+            servers.forEach(s => { stream.state[s.id] = s; });
+            stream.handlers.forEach(handler => {
+                try {
+                    handler(servers);
+                } catch (error) {
+                    console.error('Live update handler failed:', error);
+                }
+            });
+        };
+        if (window.EventSource) {
+            stream.source = new EventSource(key ? `/api/stream?servers=${key}` : '/api/stream');
+            stream.source.addEventListener('servers', e => deliver(JSON.parse(e.data)));
+        } else {
+            const poll = async () => {
+                try {
+                    const servers = await (await fetch('/api/servers')).json();
+                    deliver(serverIds ? servers.filter(s => serverIds.includes(s.id)) : servers);
+                } catch (error) {
+                    console.error('Failed to poll servers:', error);
+                }
+            };
+            poll();
+            stream.timer = setInterval(poll, 30000);
+        }
+    }
+    stream.handlers.push(onServers);
+    // Late subscribers start from the state seen so far
+    const known = Object.values(stream.state);
+    if (known.length) {
+        setTimeout(() => onServers(known), 0);
+    }
+    return () => {
+        stream.handlers = stream.handlers.filter(handler => handler !== onServers);
+        if (stream.handlers.length === 0) {
+            if (stream.source) stream.source.close();
+            if (stream.timer) clearInterval(stream.timer);
+            delete liveStreams[key];
+        }
+    };
+}
+
 class ServerCheckApp {
     constructor() {
         this.init();
@@ -45,11 +98,9 @@ class ServerCheckApp {
     }
 
     setupAutoRefresh() {
-        // Auto-refresh dashboard every 30 seconds
+        // Dashboard cards follow the live update stream (shared with the page's own subscription)
         if (window.location.pathname === '/') {
-            setInterval(() => {
-                this.refreshDashboard();
-            }, 30000);
+            subscribeUpdates(null, servers => this.updateServerCards(servers));
         }
     }
 
@@ -79,6 +130,8 @@ class ServerCheckApp {
                 }
                 
                 currentUrl.searchParams.set('sort', newSort);
+                // Page cursors belong to the previous order
+                ['page', 'after', 'before'].forEach(name => currentUrl.searchParams.delete(name));
                 window.location.href = currentUrl.toString();
             });
         });